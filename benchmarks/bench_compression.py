@@ -0,0 +1,68 @@
+"""
+Benchmark: size and time of compressing the order list at each level
+
+Serializes a list of orders the way GET /orders does, then compresses it
+with gzip at every level and, when the brotli package is installed, with
+brotli at a range of qualities. Reports the compressed size, the ratio and
+the time to compress, to choose COMPRESSION_LEVEL and
+COMPRESSION_BROTLI_QUALITY. Run from the repository root:
+
+  python benchmarks/bench_compression.py --orders 1000 --items 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+
+# pylint: disable=wrong-import-position
+from service.compression import brotli, compress
+from tests.factories import OrderFactory, OrderItemFactory
+
+
+def make_body(orders, items):
+    """Returns the JSON body of a list of orders"""
+    data = [
+        OrderFactory(id=order_id, order_items=[OrderItemFactory(id=order_id * items + n, order_id=order_id)
+                                               for n in range(items)]).serialize()
+        for order_id in range(1, orders + 1)
+    ]
+    return (json.dumps(data) + "\n").encode("utf-8")
+
+
+def settings():
+    """Returns the (encoding, config) pairs to measure"""
+    for level in range(1, 10):
+        yield "gzip", {"COMPRESSION_LEVEL": level}
+    if brotli is not None:
+        for quality in (0, 2, 4, 6, 9, 11):
+            yield "br", {"COMPRESSION_BROTLI_QUALITY": quality}
+
+
+def main():
+    """Compresses the body with every setting and prints a summary"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=1000, help="orders in the list")
+    parser.add_argument("--items", type=int, default=5, help="items per order")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per setting")
+    args = parser.parse_args()
+
+    body = make_body(args.orders, args.items)
+    print("uncompressed: {} bytes".format(len(body)))
+    print("{:<10}{:>8}{:>12}{:>10}{:>12}".format("encoding", "level", "bytes", "ratio", "median ms"))
+    for encoding, config in settings():
+        runs = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            size = len(compress(body, encoding, config))
+            runs.append((time.perf_counter() - start) * 1000)
+        print("{:<10}{:>8}{:>12}{:>10.1f}{:>12.2f}".format(
+            encoding, list(config.values())[0], size, len(body) / size, statistics.median(runs)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: the gunicorn profile of gunicorn.conf.py against one sync worker
+
+Seeds the database, then puts the same concurrent read load on gunicorn run
+as the Procfile used to (one sync worker) and with gunicorn.conf.py. Uses a
+SQLite file unless DATABASE_URI is set. Threads and extra workers pay off
+when requests wait on a database across the network; --db-latency-ms adds
+such a wait to every SQL statement (see latency_app.py). Run from the
+repository root:
+
+  python benchmarks/bench_gunicorn.py --concurrency 32 --duration 20
+  python benchmarks/bench_gunicorn.py --db-latency-ms 5
+  WEB_CONCURRENCY=4 GUNICORN_THREADS=8 python benchmarks/bench_gunicorn.py
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+DATABASE_FILE = os.path.join(tempfile.gettempdir(), "bench_gunicorn.db")
+os.environ.setdefault("DATABASE_URI", "sqlite:///" + DATABASE_FILE)
+
+# pylint: disable=wrong-import-position
+from benchmarks.load import free_port, python_tool, run_load, start_server, stop_server
+from service import app
+from service.models import Order, create_db, db
+from tests.factories import OrderFactory, OrderItemFactory
+
+
+def seed(orders, items):
+    """Creates orders with items and returns their ids"""
+    db.drop_all()
+    create_db()
+    order_ids = []
+    for start in range(0, orders, 500):
+        batch = [
+            OrderFactory(order_items=[OrderItemFactory() for _ in range(items)])
+            for _ in range(min(500, orders - start))
+        ]
+        order_ids.extend(Order.create_many(batch))
+    db.session.remove()
+    return order_ids
+
+
+def main():
+    """Runs the same load against both gunicorn setups"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=2000, help="orders to seed")
+    parser.add_argument("--items", type=int, default=5, help="items per seeded order")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load per setup")
+    parser.add_argument("--db-latency-ms", type=float, default=0, help="delay added to every SQL statement")
+    args = parser.parse_args()
+
+    app.logger.setLevel(logging.CRITICAL)
+    order_ids = seed(args.orders, args.items)
+    paths = ["/api/orders?limit=20&after={}".format(random.choice(order_ids)) for _ in range(50)]
+    paths += ["/api/orders/{}".format(random.choice(order_ids)) for _ in range(50)]
+    random.shuffle(paths)
+
+    gunicorn = python_tool("gunicorn")
+    target = "benchmarks.latency_app:app" if args.db_latency_ms else "service:app"
+    setups = {
+        "1 sync worker": gunicorn + ["--config=/dev/null", "--workers=1", "--bind=127.0.0.1:{port}", target],
+        "gunicorn.conf.py": gunicorn + ["--config=gunicorn.conf.py", "--bind=127.0.0.1:{port}", target],
+    }
+    env = {"BENCH_DB_LATENCY_MS": str(args.db_latency_ms)}
+    results = {}
+    for name, command in setups.items():
+        port = free_port()
+        server = start_server([part.format(port=port) for part in command], port, env)
+        try:
+            results[name] = run_load("http://127.0.0.1:{}".format(port), paths, args.concurrency, args.duration)
+        finally:
+            stop_server(server)
+        print("{:<20} {}".format(name, json.dumps(results[name])))
+    print("throughput gain: {:.2f}x".format(
+        results["gunicorn.conf.py"]["requests_per_second"] / results["1 sync worker"]["requests_per_second"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: time a request thread spends logging
+
+Logs info lines with a handler that writes to a slow stream, as a pipe to a
+busy log collector would be, first directly and then through the queue of
+service/logs.py. Reports the time per call seen by the caller. Run from the
+repository root:
+
+  python benchmarks/bench_logging.py --lines 2000 --write-us 200
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+
+# pylint: disable=wrong-import-position
+from service.logs import LogQueue
+
+
+class SlowStream(io.StringIO):
+    """A stream whose writes take a fixed time"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return super().write(text)
+
+
+def timed(logger, lines):
+    """Returns the mean microseconds of one logging call"""
+    start = time.perf_counter()
+    for number in range(lines):
+        logger.info("Request for order with id: %s", number)
+    return (time.perf_counter() - start) / lines * 1e6
+
+
+def main():
+    """Runs the benchmark and prints a summary"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=2000, help="lines logged per setup")
+    parser.add_argument("--write-us", type=float, default=200, help="time one write to the stream takes")
+    parser.add_argument("--queue-size", type=int, default=10000, help="records the queue holds")
+    args = parser.parse_args()
+
+    formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s")
+    handler = logging.StreamHandler(SlowStream(args.write_us / 1e6))
+    handler.setFormatter(formatter)
+    logger = logging.getLogger("bench_logging")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    logger.handlers = [handler]
+    direct = timed(logger, args.lines)
+
+    log_queue = LogQueue([handler], args.queue_size, 1.0)
+    log_queue.start()
+    logger.handlers = [log_queue.handler]
+    queued = timed(logger, args.lines)
+    start = time.perf_counter()
+    log_queue.stop()
+    drain = time.perf_counter() - start
+
+    print("direct   {:10.1f} us per call".format(direct))
+    print("queued   {:10.1f} us per call, {} dropped, {:.2f} s to drain".format(
+        queued, log_queue.handler.dropped, drain))
+
+
+if __name__ == "__main__":
+    main()
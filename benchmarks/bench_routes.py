@@ -0,0 +1,252 @@
+"""
+Benchmark: latency and SQL query count of every route
+
+Seeds the database with orders built by the test factories, then times each
+route of service/routes.py through the Flask test client. Reports p50, p95
+and p99 latency plus the mean number of SQL statements per request, and
+saves the results as JSON so runs can be compared. Run from the repository
+root:
+
+  python benchmarks/bench_routes.py --orders 1000 --items 5
+  python benchmarks/bench_routes.py --compare bench_routes.json
+  python benchmarks/bench_routes.py --encoding gzip --compare bench_routes.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+
+# pylint: disable=wrong-import-position
+from sqlalchemy import event
+from service import app
+from service.models import Order, db
+from tests.factories import OrderFactory, OrderItemFactory
+
+BASE_API = "/api/orders"
+CONTENT_TYPE_JSON = "application/json"
+
+
+class QueryCounter:
+    """Counts the SQL statements sent through the engine"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def seed(orders, items):
+    """Creates orders with items and returns their ids"""
+    db.drop_all()
+    db.create_all()
+    Order.cache.clear()
+    order_ids = []
+    batch_size = 500
+    for start in range(0, orders, batch_size):
+        batch = [
+            OrderFactory(order_items=[OrderItemFactory() for _ in range(items)])
+            for _ in range(min(batch_size, orders - start))
+        ]
+        order_ids.extend(Order.create_many(batch))
+    return order_ids
+
+
+def item_payload():
+    """Returns the body of a new item"""
+    return OrderItemFactory().serialize()
+
+
+def order_payload(items):
+    """Returns the body of a new order"""
+    return OrderFactory(order_items=[OrderItemFactory() for _ in range(items)]).serialize()
+
+
+def build_cases(client, order_ids, items):
+    """
+    Returns the benchmark cases as (name, prepare) pairs
+
+    prepare() runs untimed and returns the (method, url, kwargs) of the
+    request to time
+    """
+    def any_order():
+        return random.choice(order_ids)
+
+    def any_item(order_id):
+        data = client.get("{}/{}/items".format(BASE_API, order_id)).get_json()
+        return data[0] if data else None
+
+    def new_item(order_id):
+        resp = client.post("{}/{}/items".format(BASE_API, order_id),
+                           json=item_payload(), content_type=CONTENT_TYPE_JSON)
+        return resp.get_json()
+
+    def get_order_not_modified():
+        url = "{}/{}".format(BASE_API, any_order())
+        etag = client.get(url).headers["ETag"]
+        return "get", url, {"headers": {"If-None-Match": etag}}
+
+    def update_order():
+        order_id = any_order()
+        return "put", "{}/{}".format(BASE_API, order_id), {
+            "json": {"cust_id": random.randint(100, 104)}, "content_type": CONTENT_TYPE_JSON}
+
+    def get_item():
+        order_id = any_order()
+        item = any_item(order_id) or new_item(order_id)
+        return "get", "{}/{}/items/{}".format(BASE_API, order_id, item["id"]), {}
+
+    def update_item():
+        order_id = any_order()
+        item = any_item(order_id) or new_item(order_id)
+        item["item_qty"] = random.randint(1, 10)
+        return "put", "{}/{}/items/{}".format(BASE_API, order_id, item["id"]), {
+            "json": item, "content_type": CONTENT_TYPE_JSON}
+
+    def delete_item():
+        order_id = any_order()
+        item = new_item(order_id)
+        return "delete", "{}/{}/items/{}".format(BASE_API, order_id, item["id"]), {}
+
+    return [
+        ("list_orders", lambda: ("get", BASE_API, {})),
+        ("list_orders_by_cust_id", lambda: (
+            "get", BASE_API, {"query_string": {"cust_id": random.randint(101, 104)}})),
+        ("list_orders_by_item_id", lambda: (
+            "get", BASE_API, {"query_string": {"item_id": random.choice([11, 22, 33, 44, 55])}})),
+        ("list_orders_by_filters", lambda: ("get", BASE_API, {"query_string": {
+            "cust_id": random.randint(101, 104), "item_id": random.choice([11, 22, 33, 44, 55]),
+            "status": "Received"}})),
+        ("export_orders", lambda: ("get", BASE_API + "/export", {})),
+        ("get_order", lambda: ("get", "{}/{}".format(BASE_API, any_order()), {})),
+        ("get_order_not_modified", get_order_not_modified),
+        ("create_order", lambda: ("post", BASE_API, {
+            "json": order_payload(items), "content_type": CONTENT_TYPE_JSON})),
+        ("create_orders_batch", lambda: ("post", BASE_API + ":batch", {
+            "json": [order_payload(items) for _ in range(10)], "content_type": CONTENT_TYPE_JSON})),
+        ("update_order", update_order),
+        ("list_items_in_order", lambda: ("get", "{}/{}/items".format(BASE_API, any_order()), {})),
+        ("add_item", lambda: ("post", "{}/{}/items".format(BASE_API, any_order()), {
+            "json": item_payload(), "content_type": CONTENT_TYPE_JSON})),
+        ("get_order_item", get_item),
+        ("update_order_item", update_item),
+        ("delete_item", delete_item),
+        ("cancel_order", lambda: ("put", "{}/{}/cancel".format(BASE_API, any_order()), {})),
+        ("cancel_orders_bulk", lambda: ("post", BASE_API + ":cancel", {
+            "json": {"ids": random.sample(order_ids, min(100, len(order_ids)))},
+            "content_type": CONTENT_TYPE_JSON})),
+        ("customer_summary", lambda: (
+            "get", "/api/customers/{}/summary".format(random.randint(101, 104)), {})),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    """Returns the nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_case(client, counter, prepare, requests, encoding=None):
+    """Times one case and returns its statistics"""
+    latencies = []
+    queries = []
+    sizes = []
+    for _ in range(requests):
+        method, url, kwargs = prepare()
+        if encoding:
+            kwargs.setdefault("headers", {})["Accept-Encoding"] = encoding
+        counter.count = 0
+        start = time.perf_counter()
+        resp = getattr(client, method)(url, **kwargs)
+        body = resp.get_data()  # drain streamed bodies inside the timing
+        resp.close()
+        latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+        sizes.append(len(body))
+        if resp.status_code >= 400:
+            raise RuntimeError("{} {} returned {}".format(method.upper(), url, resp.status_code))
+    latencies.sort()
+    return {
+        "requests": requests,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "queries": round(statistics.mean(queries), 2),
+        "bytes": round(statistics.mean(sizes)),
+    }
+
+
+def compare(previous, current):
+    """Prints the change of each route against a previous run"""
+    print("\n{:<26}{:>12}{:>12}{:>10}{:>14}{:>12}".format(
+        "route", "p50 before", "p50 now", "change", "bytes before", "bytes now"))
+    for name, stats in current["routes"].items():
+        before = previous["routes"].get(name)
+        if not before:
+            continue
+        change = (stats["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+        print("{:<26}{:>12.2f}{:>12.2f}{:>9.1f}%{:>14}{:>12}".format(
+            name, before["p50_ms"], stats["p50_ms"], change, before.get("bytes", "-"), stats["bytes"]))
+
+
+def main():
+    """Seeds the database, runs every case and writes the results"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=1000, help="orders to seed")
+    parser.add_argument("--items", type=int, default=5, help="items per seeded order")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per route")
+    parser.add_argument("--routes", nargs="*", help="only run these routes")
+    parser.add_argument("--output", default="bench_routes.json", help="where to save the results")
+    parser.add_argument("--compare", help="a previous results file to compare against")
+    parser.add_argument("--seed", type=int, default=2021, help="random seed")
+    parser.add_argument("--encoding", help="Accept-Encoding to send, for example gzip or br")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    app.config["TESTING"] = True
+    app.logger.setLevel(logging.CRITICAL)
+    client = app.test_client()
+    order_ids = seed(args.orders, args.items)
+    counter = QueryCounter(db.engine)
+
+    results = {
+        "meta": {
+            "orders": args.orders,
+            "items": args.items,
+            "encoding": args.encoding or "identity",
+            "database": db.engine.dialect.name,
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "routes": {},
+    }
+    print("{:<26}{:>10}{:>10}{:>10}{:>10}{:>12}".format(
+        "route", "p50 ms", "p95 ms", "p99 ms", "queries", "bytes"))
+    for name, prepare in build_cases(client, order_ids, args.items):
+        if args.routes and name not in args.routes:
+            continue
+        stats = run_case(client, counter, prepare, args.requests, args.encoding)
+        results["routes"][name] = stats
+        print("{:<26}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>12}".format(
+            name, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["queries"], stats["bytes"]))
+
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), results)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print("\nresults saved to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: serializing a list of Orders for a response
+
+Compares the old serialize-then-marshal path of the list endpoint with the
+single serialize() pass the routes use now. Run from the repository root:
+
+  python benchmarks/bench_serialization.py --orders 10000 --items 3
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+
+from flask_restx import marshal  # pylint: disable=wrong-import-position
+from service.models import Order, OrderItem, OrderStatus  # pylint: disable=wrong-import-position
+from service.routes import order_model  # pylint: disable=wrong-import-position
+
+
+def make_orders(count, items):
+    """Builds in-memory Orders shaped like rows loaded from the database"""
+    orders = []
+    for order_id in range(1, count + 1):
+        order_items = [
+            OrderItem(id=order_id * items + line, order_id=order_id, item_id=line,
+                      item_name="item {}".format(line), item_qty=line + 1, item_price=9.99)
+            for line in range(items)
+        ]
+        order = Order(id=order_id, cust_id=order_id % 100, status=OrderStatus.Received,
+                      version=1, order_items=order_items)
+        order.update_totals()
+        orders.append(order)
+    return orders
+
+
+def marshalled(orders):
+    """The old path: serialize every Order, then marshal the list again"""
+    return marshal([order.serialize() for order in orders], order_model)
+
+
+def single_pass(orders):
+    """The current path: serialize() already has the documented shape"""
+    return [order.serialize() for order in orders]
+
+
+def timed(func, orders, repeat):
+    """Returns the run times in seconds of func(orders) plus JSON encoding"""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        json.dumps(func(orders))
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def main():
+    """Runs the benchmark and prints a summary"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=10000, help="orders in the list")
+    parser.add_argument("--items", type=int, default=3, help="items per order")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per path")
+    args = parser.parse_args()
+
+    orders = make_orders(args.orders, args.items)
+    assert marshalled(orders) == single_pass(orders)
+
+    results = {}
+    for name, func in (("serialize+marshal", marshalled), ("serialize", single_pass)):
+        runs = timed(func, orders, args.repeat)
+        results[name] = statistics.median(runs)
+        print("{:<18} median {:8.1f} ms  best {:8.1f} ms".format(
+            name, results[name] * 1000, min(runs) * 1000))
+    print("speedup: {:.1f}x on {} orders with {} items each".format(
+        results["serialize+marshal"] / results["serialize"], args.orders, args.items))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: import and boot time of the service
+
+Starts fresh interpreters that import the service, the way each gunicorn
+worker does, and reports how long the import takes over a bare interpreter
+start, plus the slowest imported packages. Exits with status 1 when the
+median is over the budget, so it can guard start up time in CI. Run from
+the repository root:
+
+  python benchmarks/bench_startup.py --runs 10 --budget-ms 1500
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+\d+ \| *(\S+)$")
+
+
+def timed_run(code, env):
+    """Returns the wall clock seconds of running code in a new interpreter"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, check=True)
+    return time.perf_counter() - start
+
+
+def slowest_imports(env, count):
+    """Returns the packages that take longest to import, with their own import time in microseconds"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import service"],
+                            env=env, cwd=ROOT, check=True, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME.match(line)
+        if match:
+            name = match.group(2).split(".")[0]
+            packages[name] = packages.get(name, 0) + int(match.group(1))
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+def main():
+    """Runs the benchmark and prints a summary"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10, help="interpreters started per measurement")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="allowed median import time")
+    parser.add_argument("--top", type=int, default=8, help="slowest packages to list")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URI", "sqlite://")
+    bare = [timed_run("pass", env) for _ in range(args.runs)]
+    service = [timed_run("import service", env) for _ in range(args.runs)]
+    import_ms = (statistics.median(service) - statistics.median(bare)) * 1000
+    print("interpreter start  median {:8.1f} ms".format(statistics.median(bare) * 1000))
+    print("import service     median {:8.1f} ms  best {:8.1f} ms".format(
+        import_ms, (min(service) - min(bare)) * 1000))
+    print("\nslowest packages (ms)")
+    for name, micros in slowest_imports(env, args.top):
+        print("  {:<20}{:>10.1f}".format(name, micros / 1000))
+
+    if import_ms > args.budget_ms:
+        print("\nover budget: {:.1f} ms > {:.1f} ms".format(import_ms, args.budget_ms))
+        sys.exit(1)
+    print("\nwithin budget of {:.1f} ms".format(args.budget_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: deserializing large posted orders
+
+Compares the field by field Order.deserialize() the service used before with
+the one built on the validator compiled from create_order_model, which
+builds the OrderItems while it checks them, on orders with many lines. Run
+from the repository root:
+
+  python benchmarks/bench_validation.py --lines 1000
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+
+# pylint: disable=wrong-import-position
+from service.models import DataValidationError, Order, OrderItem
+
+
+def legacy_deserialize(order, data):
+    """The previous Order.deserialize(), kept as the baseline"""
+    try:
+        order.cust_id = int(data["cust_id"])
+        for order_item in data["order_items"]:
+            try:
+                item_id = int(order_item['item_id'])
+            except ValueError as error:
+                raise DataValidationError("Invalid Order:item_id must be int " + error.args[0])
+            item_name = str(order_item['item_name'])
+            if not item_name:
+                raise DataValidationError("Invalid Order:item_name must exist ")
+            try:
+                item_qty = int(order_item['item_qty'])
+            except ValueError as error:
+                raise DataValidationError("Invalid Order:item_qty must be int " + error.args[0])
+            try:
+                item_price = float(order_item['item_price'])
+            except ValueError as error:
+                raise DataValidationError("Invalid Order:item_price must be float " + error.args[0])
+            order.order_items.append(OrderItem(item_id=item_id, item_name=item_name,
+                                               item_qty=item_qty, item_price=item_price))
+    except KeyError as error:
+        raise DataValidationError("Invalid Order: missing " + error.args[0])
+    except TypeError as error:
+        raise DataValidationError("Invalid Order: body of request contained bad or no data: " + error.args[0])
+    except ValueError as error:
+        raise DataValidationError("Invalid Order: cust_id must be int " + error.args[0])
+    return order
+
+
+def make_payload(lines):
+    """Returns the body of an order with the given number of lines"""
+    return {
+        "cust_id": 101,
+        "status": "Received",
+        "order_items": [
+            {"item_id": line, "item_name": "item {}".format(line), "item_qty": line % 9 + 1,
+             "item_price": 9.99}
+            for line in range(lines)
+        ],
+    }
+
+
+def timed(funcs, payload, repeat):
+    """
+    Returns the run times in seconds of each func deserializing payload into a new Order
+
+    The funcs take turns, first in one order and then in the other, so a
+    slowdown of the process over the runs weighs on all of them alike
+    """
+    runs = {name: [] for name in funcs}
+    names = list(funcs)
+    for _ in range(repeat):
+        for name in names:
+            # the Orders and their items hold reference cycles: collect them
+            # between runs, as timeit does, so a collection is not timed
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                funcs[name](Order(), payload)
+                runs[name].append(time.perf_counter() - start)
+            finally:
+                gc.enable()
+        names.reverse()
+    return runs
+
+
+def main():
+    """Runs the benchmark and prints a summary"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=1000, help="items per order")
+    parser.add_argument("--repeat", type=int, default=50, help="timed runs per path")
+    args = parser.parse_args()
+
+    payload = make_payload(args.lines)
+    current = Order().deserialize(payload)
+    assert [item.serialize() for item in current.order_items] == \
+        [item.serialize() for item in legacy_deserialize(Order(), payload).order_items]
+
+    results = {}
+    runs_by_name = timed({"legacy": legacy_deserialize, "compiled": Order.deserialize},
+                         payload, args.repeat)
+    for name, runs in runs_by_name.items():
+        results[name] = statistics.median(runs)
+        print("{:<10} median {:8.2f} ms  best {:8.2f} ms".format(
+            name, results[name] * 1000, min(runs) * 1000))
+    print("speedup: {:.2f}x on orders with {} lines".format(
+        results["legacy"] / results["compiled"], args.lines))
+
+
+if __name__ == "__main__":
+    main()
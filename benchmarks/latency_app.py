@@ -0,0 +1,19 @@
+"""
+The service with a delay added to every SQL statement
+
+Served by bench_gunicorn.py to stand in for a database across the network:
+each statement sleeps BENCH_DB_LATENCY_MS milliseconds before it runs.
+"""
+import os
+import time
+from sqlalchemy import event
+from service import app
+from service.models import db
+
+LATENCY = float(os.getenv("BENCH_DB_LATENCY_MS", "0")) / 1000
+
+
+@event.listens_for(db.engine, "before_cursor_execute")
+def network_delay(conn, cursor, statement, parameters, context, executemany):
+    """Waits as long as a round trip to the database would take"""
+    time.sleep(LATENCY)
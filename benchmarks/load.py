@@ -0,0 +1,94 @@
+"""
+Helpers to run a service in a subprocess and put HTTP load on it
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def free_port():
+    """Returns a TCP port nobody listens on"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(command, port, env=None, timeout=30):
+    """Starts a server and waits until it answers on port"""
+    process = subprocess.Popen(
+        command, cwd=ROOT, env=dict(os.environ, **(env or {})),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("{} exited with {}".format(command[0], process.returncode))
+        try:
+            urllib.request.urlopen("http://127.0.0.1:{}/".format(port), timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("{} did not start in {}s".format(command[0], timeout))
+
+
+def stop_server(process):
+    """Stops a server started by start_server"""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def run_load(base_url, paths, concurrency, duration, headers=None):
+    """
+    Requests the paths round robin from concurrency threads for duration seconds
+
+    Returns the throughput, latency percentiles, error count and bytes read
+    """
+    deadline = time.time() + duration
+
+    def worker(offset):
+        latencies, errors, received = [], 0, 0
+        index = offset
+        while time.time() < deadline:
+            request = urllib.request.Request(base_url + paths[index % len(paths)], headers=headers or {})
+            index += 1
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as resp:
+                    received += len(resp.read())
+            except OSError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies, errors, received
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    elapsed = time.time() - started
+    latencies = sorted(latency for result in results for latency in result[0])
+    if not latencies:
+        raise RuntimeError("no request to {} succeeded".format(base_url))
+    return {
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+        "errors": sum(result[1] for result in results),
+        "bytes_per_request": round(sum(result[2] for result in results) / len(latencies)),
+    }
+
+
+def python_tool(name):
+    """Returns the command that runs a console script of this interpreter"""
+    script = os.path.join(os.path.dirname(sys.executable), name)
+    return [script if os.path.exists(script) else name]
@@ -19,5 +19,54 @@ if 'VCAP_SERVICES' in os.environ:
 SQLALCHEMY_DATABASE_URI = DATABASE_URI
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Connection pool of each worker process (not used with SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "2"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("true", "1", "yes")
+
+# Keyset pagination for order lists
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+# Number of orders fetched per round trip by the NDJSON export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+# Largest number of orders accepted by one batch create request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+
+# Read-through cache of serialized orders. Each process keeps its own copy, and
+# a copy is only served while its version is still the one in the database
+ORDER_CACHE_SIZE = int(os.getenv("ORDER_CACHE_SIZE", "4096"))
+ORDER_CACHE_TTL = float(os.getenv("ORDER_CACHE_TTL", "30"))
+
+# Idempotency-Key support for order creation. Keys are honoured for
+# IDEMPOTENCY_KEY_TTL seconds; `flask purge-idempotency-keys` deletes the
+# expired ones IDEMPOTENCY_PURGE_BATCH_SIZE rows at a time
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "4096"))
+IDEMPOTENCY_PURGE_BATCH_SIZE = int(os.getenv("IDEMPOTENCY_PURGE_BATCH_SIZE", "1000"))
+
+# Compression of JSON responses for clients that send Accept-Encoding.
+# Buffered responses smaller than COMPRESSION_MIN_SIZE bytes are sent as is
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))  # gzip, 1 to 9
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))  # 0 to 11
+COMPRESSION_MIMETYPES = os.getenv(
+    "COMPRESSION_MIMETYPES", "application/json,application/x-ndjson"
+).split(",")
+
+# SQL statements slower than this are logged with their parameters
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+# Report the query count and database time of each request in response headers
+SQL_PROFILING_HEADERS = os.getenv("SQL_PROFILING_HEADERS", "false").lower() in ("true", "1", "yes")
+
+# Log records wait in a queue of LOG_QUEUE_SIZE records for a background
+# writer; when it is full they are dropped. LOG_SAMPLE_RATE is the share of
+# requests that log their info records (warnings are always logged)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
 # Secret for session management
 SECRET_KEY = os.getenv("SECRET_KEY", "s3cr3t-key-shhhh")
\ No newline at end of file
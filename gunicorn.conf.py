@@ -0,0 +1,87 @@
+"""
+Gunicorn settings for running the service in production
+
+Read by gunicorn from the working directory, or with --config. Every
+setting can be changed from the environment:
+
+  WEB_CONCURRENCY          worker processes (default 2 x CPUs + 1, at most 4
+                           and one per GUNICORN_WORKER_MEMORY_MB of MEMORY_LIMIT)
+  GUNICORN_WORKER_MEMORY_MB  memory to allow each worker (default 64)
+  GUNICORN_WORKER_CLASS    gthread (default), sync or gevent
+  GUNICORN_THREADS         threads per gthread worker (default 4)
+  GUNICORN_PRELOAD         import the app once in the master (default true)
+  GUNICORN_MAX_REQUESTS    requests before a worker is replaced (default 1000, 0 never)
+  GUNICORN_TIMEOUT         seconds a request may take before its worker is killed (default 30)
+
+Each worker is a full copy of the app with its own connection pool, so the
+default count also fits the memory limit Cloud Foundry sets in MEMORY_LIMIT:
+two workers on the 128M instances of the manifests. Keep GUNICORN_THREADS at or
+below DB_POOL_SIZE + DB_MAX_OVERFLOW, and instances x workers x
+(DB_POOL_SIZE + DB_MAX_OVERFLOW) within the connection limit of the
+database plan.
+"""
+import os
+
+
+def cpu_count():
+    """Returns the CPUs this process may run on, which containers may limit"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def memory_limit_mb():
+    """Returns the instance memory limit in MB from MEMORY_LIMIT (e.g. 128m or 1G), or None"""
+    limit = os.getenv("MEMORY_LIMIT", "").strip().lower()
+    units = {"m": 1, "g": 1024}
+    if limit[-1:] in units and limit[:-1].isdigit():
+        return int(limit[:-1]) * units[limit[-1]]
+    return None
+
+
+def default_workers():
+    """Returns two workers per CPU plus one, as many as the memory limit holds and at most 4"""
+    workers = min(cpu_count() * 2 + 1, 4)
+    limit = memory_limit_mb()
+    if limit is not None:
+        per_worker = int(os.getenv("GUNICORN_WORKER_MEMORY_MB", "64"))
+        workers = min(workers, max(limit // per_worker, 1))
+    return workers
+
+
+bind = "0.0.0.0:{}".format(os.getenv("PORT", "8080"))
+workers = int(os.getenv("WEB_CONCURRENCY", str(default_workers())))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+# gevent workers serve many requests per process, limited by the pool
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "100"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("true", "1", "yes")
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+# spread the restarts so the workers are not all replaced at once
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", str(max_requests // 10)))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = timeout
+keepalive = 5
+errorlog = "-"
+
+
+def pre_fork(server, worker):
+    """Closes the connections of the master before it forks a worker"""
+    if server.cfg.preload_app:
+        # a worker must not inherit, and so share, a socket to the database.
+        # SQLAlchemy 1.3 closes the connections on dispose(), which would
+        # also close them for the master if it were done in the worker
+        from service import app  # pylint: disable=import-outside-toplevel
+        from service.models import db  # pylint: disable=import-outside-toplevel
+        with app.app_context():
+            db.engine.dispose()
+
+
+def post_fork(server, worker):
+    """Makes the database driver cooperate with gevent workers"""
+    if worker_class == "gevent":
+        try:
+            from psycogreen.gevent import patch_psycopg  # pylint: disable=import-outside-toplevel
+            patch_psycopg()
+        except ImportError:
+            server.log.warning("psycogreen is not installed: database calls block the gevent worker")
@@ -4,7 +4,6 @@ Package for the application models and service routes
 This module creates and configures the Flask app and sets up the logging
 and SQL database
 """
-import os
 import sys
 import logging
 from flask import Flask
@@ -14,7 +13,7 @@ app = Flask(__name__)
 app.config.from_object("config")
 
 # Import the routes After the Flask app is created
-from service import routes, models, error_handlers
+from service import routes, models, error_handlers, metrics, commands, compression, logs
 
 # Set up logging for production
 if __name__ != "__main__":
@@ -28,6 +27,8 @@ if __name__ != "__main__":
     )
     for handler in app.logger.handlers:
         handler.setFormatter(formatter)
+    # write the log lines from a background thread, off the request path
+    logs.init_app(app)
     app.logger.info("Logging handler established")
 
 app.logger.info(70 * "*")
@@ -35,7 +36,7 @@ app.logger.info("  O R D E R   S E R V I C E   R U N N I N G  ".center(70, "*"))
 app.logger.info(70 * "*")
 
 try:
-    models.init_db(app)  # make our sqlalchemy tables
+    models.init_db(app)  # tables are created by `flask db-create`
 except Exception as error:
     app.logger.critical("%s: Cannot continue", error)
     # gunicorn requires exit code 4 to stop spawning workers when they die
@@ -0,0 +1,379 @@
+"""
+Module: asgi
+
+Optional asynchronous serving mode for the order API.
+
+The read endpoints (order list, export, single order, items of an order and
+a single item) are answered natively over asyncpg, so one process can keep
+hundreds of requests in flight while PostgreSQL works on them. Every other
+request - writes, error responses, the Swagger docs and the UI - is handed
+to the Flask application on a thread pool, so both modes serve the same
+resources and payloads.
+
+The native endpoints match If-None-Match and record their requests and SQL
+statements like the Flask routes: they are counted on /metrics under the
+same handler names, slow statements are logged to the slow query log and
+SQL_PROFILING_HEADERS adds the same headers. They are not compressed, as
+the Flask responses are; leave that to the proxy in front of the service.
+
+Needs PostgreSQL and the packages in requirements-async.txt:
+
+  uvicorn service.asgi:app --host 0.0.0.0 --port 8080
+"""
+import contextlib
+import functools
+import json
+import os
+import time
+from urllib.parse import urlencode
+
+import asyncpg
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags, quote_etag
+
+from service import app as flask_app
+from service import profiling
+from service.compression import matching_variant
+from service.metrics import registry
+from service.models import OrderStatus
+
+ORDER_COLUMNS = "id, cust_id, status, version, item_count, total_amount"
+ITEM_COLUMNS = "id, order_id, item_id, item_name, item_qty, item_price, version"
+LIST_ARGS = ("cust_id", "item_id", "status", "min_id", "max_id", "limit", "after")
+FILTER_ARGS = ("cust_id", "item_id", "status", "min_id", "max_id")
+ORDER_STATUSES = frozenset(order_status.name for order_status in OrderStatus)
+
+
+######################################################################
+#  S E R I A L I Z A T I O N
+######################################################################
+def serialize_item(row):
+    """Serializes an order_item row like OrderItem.serialize()"""
+    return {
+        "id": row["id"],
+        "order_id": row["order_id"],
+        "item_id": row["item_id"],
+        "item_name": row["item_name"],
+        "item_qty": row["item_qty"],
+        "item_price": row["item_price"],
+        "version": row["version"],
+    }
+
+
+def serialize_order(row, items):
+    """Serializes an order row and its item rows like Order.serialize()"""
+    return {
+        "id": row["id"],
+        "cust_id": row["cust_id"],
+        "order_items": [serialize_item(item) for item in items],
+        "status": row["status"],
+        "version": row["version"],
+        "item_count": row["item_count"],
+        "total_amount": row["total_amount"],
+    }
+
+
+def order_etag(row):
+    """Returns the strong entity tag the Flask routes give an order row"""
+    return "{}-{}".format(row["id"], row["version"])
+
+
+def item_etag(row):
+    """Returns the strong entity tag the Flask routes give an order_item row"""
+    return "{}-{}-{}".format(row["order_id"], row["id"], row["version"])
+
+
+######################################################################
+#  I N S T R U M E N T A T I O N
+######################################################################
+class ProfiledConnection:
+    """
+    An asyncpg connection that charges its statements to a request
+
+    The counterpart of the engine hooks of service.profiling: the statements
+    are counted and timed in request.state, and slow ones are logged
+    """
+
+    def __init__(self, conn, request):
+        self.conn = conn
+        self.request = request
+
+    async def fetch(self, sql, *params):
+        """Runs a query and returns all of its rows"""
+        return await self.run(self.conn.fetch, sql, params)
+
+    async def fetchrow(self, sql, *params):
+        """Runs a query and returns its first row, or None"""
+        return await self.run(self.conn.fetchrow, sql, params)
+
+    async def run(self, method, sql, params):
+        """Runs a query with method and records how long it took"""
+        start = time.perf_counter()
+        try:
+            return await method(sql, *params)
+        finally:
+            elapsed = time.perf_counter() - start
+            state = self.request.state
+            state.db_queries = getattr(state, "db_queries", 0) + 1
+            state.db_time = getattr(state, "db_time", 0.0) + elapsed
+            profiling.log_slow_statement(
+                flask_app.config, elapsed, "{} {}".format(self.request.method, self.request.url.path),
+                sql, params,
+            )
+
+
+@contextlib.asynccontextmanager
+async def acquire(request):
+    """Acquires a pooled connection whose statements are charged to request"""
+    async with request.app.state.pool.acquire() as conn:
+        yield ProfiledConnection(conn, request)
+
+
+def instrumented(handler):
+    """
+    Records the requests an endpoint serves in the metrics of the Flask routes
+
+    handler is the name of the Flask resource that serves the same requests,
+    so both modes add to the same series on /metrics. Requests the endpoint
+    hands to Flask are recorded by Flask itself.
+    """
+    def decorate(endpoint):
+        @functools.wraps(endpoint)
+        async def serve(request):
+            start = time.perf_counter()
+            request.state.db_queries = 0
+            request.state.db_time = 0.0
+            flask_app.logger.info("Request %s %s", request.method, request.url.path)
+            response = await endpoint(request)
+            if response is request.app.state.flask:
+                return response
+            queries, db_time = request.state.db_queries, request.state.db_time
+            registry.observe(handler, request.method, response.status_code,
+                             time.perf_counter() - start, queries, db_time)
+            if flask_app.config.get("SQL_PROFILING_HEADERS"):
+                response.headers["X-DB-Query-Count"] = str(queries)
+                response.headers.append(
+                    "Server-Timing", 'db;dur={:.3f};desc="{} queries"'.format(db_time * 1000, queries)
+                )
+            return response
+        return serve
+    return decorate
+
+
+def not_modified(request, etag):
+    """Returns 304 Not Modified if the request's If-None-Match matches etag, or None"""
+    matched = matching_variant(parse_etags(request.headers.get("if-none-match")), etag)
+    if matched is None:
+        return None
+    return Response(status_code=304, headers={"ETag": quote_etag(matched), "Vary": "Accept-Encoding"})
+
+
+######################################################################
+#  Q U E R I E S
+######################################################################
+def list_query(args, limit):
+    """
+    Builds the SQL and parameters of one page of the order list
+
+    Mirrors OrderCollection.get and Order.filter_query: every filter given
+    is a condition of one WHERE clause and pages are keyed on order.id
+    """
+    conditions = []
+    params = []
+    for name, condition in (
+            ("cust_id", "cust_id = ${}"),
+            ("item_id", "id IN (SELECT order_id FROM order_item WHERE item_id = ${})"),
+            ("status", "status = ${}"),
+            ("min_id", "id >= ${}"),
+            ("max_id", "id <= ${}"),
+            ("after", "id > ${}")):
+        if args.get(name) is not None:
+            params.append(args[name])
+            conditions.append(condition.format(len(params)))
+    params.append(limit)
+    sql = 'SELECT {} FROM "order"{} ORDER BY id LIMIT ${}'.format(
+        ORDER_COLUMNS,
+        " WHERE " + " AND ".join(conditions) if conditions else "",
+        len(params),
+    )
+    return sql, params
+
+
+async def fetch_items(conn, order_ids):
+    """Returns the item rows of the orders grouped by order id"""
+    items = {order_id: [] for order_id in order_ids}
+    rows = await conn.fetch(
+        "SELECT {} FROM order_item WHERE order_id = ANY($1::int[]) ORDER BY id".format(ITEM_COLUMNS),
+        list(order_ids),
+    )
+    for row in rows:
+        items[row["order_id"]].append(row)
+    return items
+
+
+######################################################################
+#  E N D P O I N T S
+######################################################################
+def parse_list_args(request):
+    """Returns the list query args as ints, or None if Flask has to validate them"""
+    args = {}
+    for name, value in request.query_params.multi_items():
+        if name not in LIST_ARGS or name in args:
+            return None
+        if name == "status":
+            if value not in ORDER_STATUSES:
+                return None
+            args[name] = value
+            continue
+        try:
+            args[name] = int(value)
+        except ValueError:
+            return None
+    return args
+
+
+@instrumented("OrderCollection")
+async def list_orders(request):
+    """Lists one page of orders with a Link header to the next page"""
+    config = flask_app.config
+    args = parse_list_args(request)
+    if args is None:
+        return request.app.state.flask
+    limit = args.get("limit", config["DEFAULT_PAGE_SIZE"])
+    if not 1 <= limit <= config["MAX_PAGE_SIZE"] or any(
+            args.get(name, 0) < 0 for name in ("after", "min_id", "max_id")):
+        return request.app.state.flask
+    sql, params = list_query(args, limit + 1)
+    async with acquire(request) as conn:
+        rows = await conn.fetch(sql, *params)
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_args = {name: args[name] for name in FILTER_ARGS if name in args}
+            next_args.update(limit=limit, after=rows[-1]["id"])
+            next_url = request.url.replace(query=urlencode(next_args))
+            headers["Link"] = '<{}>; rel="next"'.format(next_url)
+        items = await fetch_items(conn, [row["id"] for row in rows])
+    return JSONResponse([serialize_order(row, items[row["id"]]) for row in rows], headers=headers)
+
+
+@instrumented("OrderExport")
+async def export_orders(request):
+    """Streams every order as newline delimited JSON"""
+    batch_size = flask_app.config["EXPORT_BATCH_SIZE"]
+
+    async def generate():
+        last_id = 0
+        while True:
+            async with acquire(request) as conn:
+                rows = await conn.fetch(
+                    'SELECT {} FROM "order" WHERE id > $1 ORDER BY id LIMIT $2'.format(ORDER_COLUMNS),
+                    last_id, batch_size,
+                )
+                if not rows:
+                    return
+                items = await fetch_items(conn, [row["id"] for row in rows])
+            yield "".join(
+                json.dumps(serialize_order(row, items[row["id"]])) + "\n" for row in rows
+            )
+            last_id = rows[-1]["id"]
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+async def fetch_order(request):
+    """
+    Returns the serialized order of the path and its ETag header
+
+    Returns the Flask application instead to have it answer 404, or a 304
+    response if the client's ETag is current
+    """
+    order_id = request.path_params["order_id"]
+    async with acquire(request) as conn:
+        row = await conn.fetchrow(
+            'SELECT {} FROM "order" WHERE id = $1'.format(ORDER_COLUMNS), order_id
+        )
+        if row is None:
+            return request.app.state.flask, None
+        etag = order_etag(row)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response, None
+        items = await fetch_items(conn, [order_id])
+    return serialize_order(row, items[order_id]), {"ETag": quote_etag(etag)}
+
+
+@instrumented("OrderResource")
+async def get_order(request):
+    """Returns an order, or 304 Not Modified if the client's ETag is current"""
+    order, headers = await fetch_order(request)
+    if headers is None:
+        return order
+    return JSONResponse(order, headers=headers)
+
+
+@instrumented("OrderItemCollection")
+async def list_order_items(request):
+    """Returns the items of an order, or 304 Not Modified if the client's ETag is current"""
+    order, headers = await fetch_order(request)
+    if headers is None:
+        return order
+    return JSONResponse(order["order_items"], headers=headers)
+
+
+@instrumented("OrderItemResource")
+async def get_order_item(request):
+    """Returns one item of an order"""
+    async with acquire(request) as conn:
+        row = await conn.fetchrow(
+            "SELECT {} FROM order_item WHERE id = $1 AND order_id = $2".format(ITEM_COLUMNS),
+            request.path_params["item_id"], request.path_params["order_id"],
+        )
+    if row is None:
+        return request.app.state.flask
+    return JSONResponse(serialize_item(row), headers={"ETag": quote_etag(item_etag(row))})
+
+
+######################################################################
+#  A P P L I C A T I O N
+######################################################################
+def create_app(wsgi_app=flask_app):
+    """Creates the ASGI application in front of the Flask application"""
+    config = wsgi_app.config
+    database_uri = config["SQLALCHEMY_DATABASE_URI"]
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        if not database_uri.startswith("postgres"):
+            raise RuntimeError("The async serving mode needs a PostgreSQL DATABASE_URI")
+        app.state.pool = await asyncpg.create_pool(
+            database_uri,
+            min_size=1,
+            max_size=config["DB_POOL_SIZE"] + config["DB_MAX_OVERFLOW"],
+            max_inactive_connection_lifetime=config["DB_POOL_RECYCLE"],
+        )
+        try:
+            yield
+        finally:
+            await app.state.pool.close()
+
+    flask = WSGIMiddleware(wsgi_app, workers=int(os.getenv("ASGI_WSGI_THREADS", "10")))
+    app = Starlette(
+        routes=[
+            Route("/api/orders", list_orders, methods=["GET"]),
+            Route("/api/orders/export", export_orders, methods=["GET"]),
+            Route("/api/orders/{order_id:int}", get_order, methods=["GET"]),
+            Route("/api/orders/{order_id:int}/items", list_order_items, methods=["GET"]),
+            Route("/api/orders/{order_id:int}/items/{item_id:int}", get_order_item, methods=["GET"]),
+            Mount("/", app=flask),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.flask = flask
+    return app
+
+
+app = create_app()
@@ -0,0 +1,28 @@
+"""
+Module: commands
+
+Maintenance commands run with the flask CLI, e.g.
+
+  FLASK_APP=service:app flask db-create
+  FLASK_APP=service:app flask purge-idempotency-keys
+"""
+import click
+from service.models import IdempotencyKey, create_db
+from . import app
+
+
+@app.cli.command("db-create")
+def db_create():
+    """Creates the missing database tables, columns and indexes"""
+    create_db()
+    click.echo("Database tables, columns and indexes are up to date")
+
+
+@app.cli.command("purge-idempotency-keys")
+@click.option("--batch-size", type=int, default=None,
+              help="Keys deleted per transaction (default IDEMPOTENCY_PURGE_BATCH_SIZE)")
+def purge_idempotency_keys(batch_size):
+    """Deletes the expired Idempotency-Key records"""
+    batch_size = batch_size or app.config["IDEMPOTENCY_PURGE_BATCH_SIZE"]
+    purged = IdempotencyKey.purge_expired(batch_size)
+    click.echo("Purged {} expired idempotency keys".format(purged))
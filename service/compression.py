@@ -0,0 +1,137 @@
+"""
+Module: compression
+
+Negotiated compression of JSON responses.
+
+Responses whose mimetype is in COMPRESSION_MIMETYPES are compressed with
+brotli (when the brotli package is installed) or gzip, whichever the client
+prefers in Accept-Encoding. Buffered responses are compressed when they
+are at least COMPRESSION_MIN_SIZE bytes long; streamed responses, such as
+the NDJSON export, are always compressed chunk by chunk as they are sent.
+
+A compressed response is a different representation, so its strong ETag
+gets the encoding appended ("12-3" becomes "12-3-gzip"). etag_variants()
+lists the tags a client may send back for one version of a resource, and
+matching_variant() finds the one an If-None-Match header names.
+"""
+import zlib
+from flask import request
+from . import app
+
+try:
+    import brotli
+except ImportError:  # optional, see requirements.txt
+    brotli = None
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def etag_variants(etag):
+    """Returns the ETag of a resource version and of its compressed representations"""
+    return [etag] + ["{}-{}".format(etag, encoding) for encoding in ENCODINGS]
+
+
+def matching_variant(if_none_match, etag):
+    """
+    Returns the tag of a resource version that an If-None-Match header matches, or None
+
+    The tags of every encoding of the version match, weak or strong, as
+    If-None-Match uses the weak comparison of RFC 9110
+
+    Args:
+        if_none_match (ETags): the parsed If-None-Match header
+        etag (str): the unquoted strong ETag of the version
+    """
+    if not if_none_match:
+        return None
+    for tag in etag_variants(etag):
+        if if_none_match.contains_weak(tag):
+            return tag
+    return None
+
+
+def negotiate(accept_encodings):
+    """Returns the encoding to compress with, or None if the client accepts none"""
+    encoding = accept_encodings.best_match(ENCODINGS)
+    return encoding if encoding and accept_encodings[encoding] > 0 else None
+
+
+def compressor(encoding, config):
+    """Returns a new streaming compressor for encoding"""
+    if encoding == "br":
+        return brotli.Compressor(quality=config["COMPRESSION_BROTLI_QUALITY"])
+    # wbits 31 writes the gzip header and trailer
+    return zlib.compressobj(config["COMPRESSION_LEVEL"], zlib.DEFLATED, 31)
+
+
+def compress(data, encoding, config):
+    """Returns data compressed with encoding"""
+    engine = compressor(encoding, config)
+    if encoding == "br":
+        return engine.process(data) + engine.finish()
+    return engine.compress(data) + engine.flush()
+
+
+def compress_stream(chunks, encoding, config):
+    """
+    Compresses an iterable of body chunks as it is consumed
+
+    The compressor only emits output when its buffer fills, so many small
+    chunks, such as one line per order, still compress well
+    """
+    engine = compressor(encoding, config)
+    if encoding == "br":
+        process, finish = engine.process, engine.finish
+    else:
+        process, finish = engine.compress, engine.flush
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = process(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+######################################################################
+# Response hook
+######################################################################
+@app.after_request
+def compress_response(response):
+    """Compresses the response body if the client accepts a supported encoding"""
+    config = app.config
+    if response.status_code == 304:
+        # a 304 stands for the 200 it validates, which varies with the encoding
+        response.vary.add("Accept-Encoding")
+        return response
+    if (
+        response.mimetype not in config["COMPRESSION_MIMETYPES"]
+        or response.status_code < 200
+        or response.status_code == 204
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or "no-transform" in response.headers.get("Cache-Control", "")
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(request.accept_encodings)
+    if encoding is None or request.method == "HEAD":
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, config)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < config["COMPRESSION_MIN_SIZE"]:
+            return response
+        response.set_data(compress(data, encoding, config))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag("{}-{}".format(etag, encoding))
+    return response
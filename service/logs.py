@@ -0,0 +1,112 @@
+"""
+Module: logs
+
+Logging off the request path.
+
+init_app() moves the handlers of the app logger behind a bounded queue: the
+request thread only puts the record on the queue, and a QueueListener thread
+formats and writes it. When the writer falls behind and the queue is full,
+records are dropped and counted instead of blocking the request.
+
+With LOG_SAMPLE_RATE below 1, only that share of requests log their debug
+and info records. The choice is made once per request, so a sampled request
+keeps all of its lines; warnings and errors are always logged.
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, has_request_context
+
+
+class DroppingQueueHandler(QueueHandler):
+    """A QueueHandler that drops records when its queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self._dropped_lock = threading.Lock()
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """A QueueListener that writes out a full queue before it stops"""
+
+    def enqueue_sentinel(self):
+        # the base class fails with queue.Full when the queue is full
+        self.queue.put(self._sentinel)
+
+
+class RequestSampler(logging.Filter):
+    """Passes the debug and info records of sampled requests only"""
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not has_request_context():
+            return True
+        return g.get("log_sampled", True)
+
+
+class LogQueue:
+    """The queue, handler and background writer of one process"""
+
+    def __init__(self, handlers, size, sample_rate):
+        self.handlers = handlers
+        self.size = size
+        self.handler = DroppingQueueHandler(queue.Queue(size))
+        if sample_rate < 1:
+            self.handler.addFilter(RequestSampler())
+        self.listener = None
+
+    def start(self):
+        """Starts the writer thread"""
+        self.listener = DrainingQueueListener(self.handler.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        """Writes out the queued records and stops the writer thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def restart_in_child(self):
+        """
+        Starts a new queue and writer in a forked process
+
+        Only the thread that forked survives, and the queue lock may have
+        been held by the writer at that moment, so neither is reused
+        """
+        if self.listener is None:
+            return
+        self.listener = None
+        self.handler.queue = queue.Queue(self.size)
+        self.start()
+
+
+def init_app(app):
+    """Puts the handlers of the app logger behind a queue"""
+    if "log_queue" in app.extensions or not app.logger.handlers:
+        return
+    log_queue = LogQueue(list(app.logger.handlers), app.config["LOG_QUEUE_SIZE"],
+                         app.config["LOG_SAMPLE_RATE"])
+    log_queue.start()
+    app.logger.handlers = [log_queue.handler]
+    app.extensions["log_queue"] = log_queue
+    atexit.register(log_queue.stop)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=log_queue.restart_in_child)
+
+    sample_rate = app.config["LOG_SAMPLE_RATE"]
+    if sample_rate < 1:
+        @app.before_request
+        def sample_request_logs():  # pylint: disable=unused-variable
+            """Decides whether the request logs its info records"""
+            g.log_sampled = random.random() < sample_rate
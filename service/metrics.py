@@ -0,0 +1,188 @@
+"""
+Module: metrics
+
+Request and database metrics served at /metrics in the Prometheus text format.
+
+Every request is counted by handler, method and status, timed into a latency
+histogram and charged with the SQL statements it ran. Updates are a few
+dictionary operations under one lock, so collection can stay on in
+production. The SQL counters come from the profiling hooks. The numbers are
+kept per worker process.
+"""
+import threading
+import time
+from collections import defaultdict
+from flask import g, request, Response
+from service.models import Order, db
+from service.pool import TimedQueuePool
+from . import app, status
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Registry:
+    """Thread safe store of the request metrics of one process"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.latency = defaultdict(lambda: [0] * len(self.buckets))
+        self.latency_sum = defaultdict(float)
+        self.latency_count = defaultdict(int)
+        self.db_queries = defaultdict(int)
+        self.db_time = defaultdict(float)
+
+    def observe(self, handler, method, status_code, seconds, queries=0, db_seconds=0.0):
+        """Records one finished request"""
+        key = (handler, method)
+        with self._lock:
+            self.requests[(handler, method, str(status_code))] += 1
+            counts = self.latency[key]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[index] += 1
+                    break
+            self.latency_sum[key] += seconds
+            self.latency_count[key] += 1
+            self.db_queries[key] += queries
+            self.db_time[key] += db_seconds
+
+    def reset(self):
+        """Forgets everything recorded so far"""
+        with self._lock:
+            self.requests.clear()
+            self.latency.clear()
+            self.latency_sum.clear()
+            self.latency_count.clear()
+            self.db_queries.clear()
+            self.db_time.clear()
+
+    def render(self):
+        """Returns the request metrics in the Prometheus text format"""
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP orders_http_requests_total Requests served by handler, method and status",
+                "# TYPE orders_http_requests_total counter",
+            ]
+            for (handler, method, code), count in sorted(self.requests.items()):
+                lines.append('orders_http_requests_total{{handler="{}",method="{}",status="{}"}} {}'.format(
+                    handler, method, code, count))
+
+            lines += [
+                "# HELP orders_http_request_duration_seconds Time spent handling requests",
+                "# TYPE orders_http_request_duration_seconds histogram",
+            ]
+            for (handler, method), counts in sorted(self.latency.items()):
+                labels = 'handler="{}",method="{}"'.format(handler, method)
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append('orders_http_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(
+                        labels, bound, cumulative))
+                lines.append('orders_http_request_duration_seconds_bucket{{{},le="+Inf"}} {}'.format(
+                    labels, self.latency_count[(handler, method)]))
+                lines.append("orders_http_request_duration_seconds_sum{{{}}} {}".format(
+                    labels, self.latency_sum[(handler, method)]))
+                lines.append("orders_http_request_duration_seconds_count{{{}}} {}".format(
+                    labels, self.latency_count[(handler, method)]))
+
+            lines += [
+                "# HELP orders_db_queries_total SQL statements run while handling requests",
+                "# TYPE orders_db_queries_total counter",
+            ]
+            for (handler, method), count in sorted(self.db_queries.items()):
+                lines.append('orders_db_queries_total{{handler="{}",method="{}"}} {}'.format(
+                    handler, method, count))
+            lines += [
+                "# HELP orders_db_query_duration_seconds_total Time spent in SQL statements while handling requests",
+                "# TYPE orders_db_query_duration_seconds_total counter",
+            ]
+            for (handler, method), seconds in sorted(self.db_time.items()):
+                lines.append('orders_db_query_duration_seconds_total{{handler="{}",method="{}"}} {}'.format(
+                    handler, method, seconds))
+        return lines
+
+
+registry = Registry()
+
+
+def handler_name():
+    """Returns the resource class or view function that serves the request"""
+    if request.url_rule is None:
+        return "unmatched"
+    view = app.view_functions.get(request.endpoint)
+    view_class = getattr(view, "view_class", None)
+    return view_class.__name__ if view_class else request.endpoint
+
+
+def gauge_lines():
+    """Returns the order cache, log queue and connection pool gauges"""
+    cache = Order.cache.stats()
+    lines = [
+        "# HELP orders_cache_hits_total Order cache lookups that found an entry",
+        "# TYPE orders_cache_hits_total counter",
+        "orders_cache_hits_total {}".format(cache["hits"]),
+        "# HELP orders_cache_misses_total Order cache lookups that went to the database",
+        "# TYPE orders_cache_misses_total counter",
+        "orders_cache_misses_total {}".format(cache["misses"]),
+    ]
+    log_queue = app.extensions.get("log_queue")
+    if log_queue is not None:
+        lines += [
+            "# HELP orders_log_records_dropped_total Log records dropped because the log queue was full",
+            "# TYPE orders_log_records_dropped_total counter",
+            "orders_log_records_dropped_total {}".format(log_queue.handler.dropped),
+        ]
+    pool = db.engine.pool
+    if isinstance(pool, TimedQueuePool):
+        stats = pool.stats()
+        lines += [
+            "# HELP orders_db_pool_checked_out Connections in use",
+            "# TYPE orders_db_pool_checked_out gauge",
+            "orders_db_pool_checked_out {}".format(stats["checked_out"]),
+            "# HELP orders_db_pool_overflow Connections opened above the pool size",
+            "# TYPE orders_db_pool_overflow gauge",
+            "orders_db_pool_overflow {}".format(stats["overflow"]),
+            "# HELP orders_db_pool_wait_seconds_total Time spent waiting for a connection",
+            "# TYPE orders_db_pool_wait_seconds_total counter",
+            "orders_db_pool_wait_seconds_total {}".format(stats["wait_time_total"]),
+        ]
+    return lines
+
+
+######################################################################
+# Request hooks
+######################################################################
+@app.before_request
+def start_request_metrics():
+    """Starts the clock of a request"""
+    g.metrics_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Records the latency, status and SQL work of a finished request"""
+    start = g.get("metrics_start")
+    if start is not None:
+        registry.observe(
+            handler_name(),
+            request.method,
+            response.status_code,
+            time.perf_counter() - start,
+            g.get("db_queries", 0),
+            g.get("db_time", 0.0),
+        )
+    return response
+
+
+######################################################################
+# GET METRICS
+######################################################################
+@app.route("/metrics")
+def metrics():
+    """ Returns the service metrics in the Prometheus text format """
+    lines = registry.render() + gauge_lines()
+    return Response("\n".join(lines) + "\n", status=status.HTTP_200_OK, content_type=PROMETHEUS_CONTENT_TYPE)
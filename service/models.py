@@ -4,30 +4,114 @@ Models for Order
 All of the models are stored in this module
 """
 import logging
+from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, func, inspect, select, text
+from sqlalchemy.orm import selectinload
+from sqlalchemy.schema import CreateColumn
 from enum import Enum
+from service.cache import LRUCache
+from service.pool import engine_options
+from service import profiling
+from service.validation import DataValidationError, compile_model, create_item_model, create_order_model
 
 logger = logging.getLogger("flask.app")
 
 # Create the SQLAlchemy object to be initialized later in init_db()
 db = SQLAlchemy()
 
+# PostgreSQL advisory lock held while the schema is created
+SCHEMA_LOCK_KEY = 72019
+
 def init_db(app):
     """Initialies the SQLAlchemy app"""
     Order.init_db(app)
 
-class DataValidationError(Exception):
-    """ Used for an data validation errors when deserializing """
-    pass
+def create_db():
+    """
+    Creates the missing tables and indexes
+
+    Run with `flask db-create` before the workers start rather than by every
+    worker on start up. Columns declared after a table was created are added
+    to it by create_columns(). On PostgreSQL an advisory lock makes instances
+    that run it at the same time wait for each other instead of racing on DDL
+    """
+    logger.info("Creating database tables")
+    with db.engine.connect() as connection:
+        locked = connection.dialect.name == "postgresql"
+        if locked:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), key=SCHEMA_LOCK_KEY)
+        try:
+            db.metadata.create_all(connection)
+            create_columns(connection)
+            create_indexes(connection)
+        finally:
+            if locked:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), key=SCHEMA_LOCK_KEY)
+
+def create_columns(connection):
+    """
+    Adds the declared columns that are missing from existing tables
+
+    db.create_all() never alters a table, so columns declared after it was
+    created, such as the versions and totals, are added here with their
+    server defaults. When the totals are added to the order table they are
+    computed from the existing items, in the same transaction
+
+    Args:
+        connection (Connection): the connection to change the schema on
+    """
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    with connection.begin():
+        for table in db.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            missing = [column for column in table.columns if column.name not in existing]
+            for column in missing:
+                logger.info("Adding column %s.%s", table.name, column.name)
+                connection.execute(text("ALTER TABLE {} ADD COLUMN {}".format(
+                    preparer.format_table(table),
+                    CreateColumn(column).compile(dialect=connection.dialect),
+                )))
+            if table is Order.__table__ and {"item_count", "total_amount"} & {c.name for c in missing}:
+                logger.info("Computing the totals of the existing orders")
+                connection.execute(table.update().values(**Order.totals_of(table.c.id)))
+
+def create_indexes(bind=None):
+    """
+    Creates the declared indexes that are missing from existing tables
+
+    db.create_all() only builds indexes together with new tables, so this
+    adds the ones declared after a table was first created
+    """
+    bind = bind or db.engine
+    inspector = inspect(bind)
+    for table in db.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                logger.info("Creating index %s", index.name)
+                index.create(bind)
 
 class OrderItem(db.Model):
     """Class that represents OrderItem model"""    
+    # Payload validator compiled from create_item_model
+    validator = staticmethod(compile_model(create_item_model))
+
+    # item_id leads so the index serves item filters and covers the join back to order
+    __table_args__ = (db.Index("ix_order_item_item_id_order_id", "item_id", "order_id"),)
+
     id = db.Column(db.Integer, primary_key = True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'))
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), index=True)
     item_id = db.Column(db.Integer) #Product ID
     item_name = db.Column(db.String(100), nullable=False) #Product name
     item_qty = db.Column(db.Integer)
     item_price = db.Column(db.Float)
+    # incremented by SQLAlchemy on every UPDATE, which only applies if the row
+    # still has the version that was loaded; otherwise StaleDataError is raised
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
 
     def serialize(self):
@@ -40,7 +124,8 @@ class OrderItem(db.Model):
             "item_id" : self.item_id,
             "item_name" : self.item_name,
             "item_qty" : self.item_qty,
-            "item_price" : self.item_price
+            "item_price" : self.item_price,
+            "version" : self.version
         }
     
     def deserialize(self, data):
@@ -49,46 +134,48 @@ class OrderItem(db.Model):
         Args:
             data (dict): A dictionary containing the resource data
         """
-       
-        try:
-            # self.order_id = data["order_id"]
-            if isinstance(data["item_id"], int):
-                self.item_id = data["item_id"]
-            else:
-                raise DataValidationError("Invalid type for int [item_id]: " + type(data["item_id"]))
-            if isinstance(data["item_name"], str):
-                self.item_name = data["item_name"]
-            else:
-                raise DataValidationError("Invalid type for int [item_name]: " + type(data["item_name"]))
-            if isinstance(data["item_qty"], int):
-                self.item_qty = data["item_qty"]
-            else:
-                raise DataValidationError("Invalid type for int [item_qty]: " + type(data["item_qty"]))
-            if isinstance(data["item_price"], float):
-                self.item_price = data["item_price"]
-            else:
-                raise DataValidationError("Invalid type for int [item_price]: " + type(data["item_price"]))
-        except KeyError as error:
-            raise DataValidationError("Invalid OrderItem: missing " + error.args[0])
-        except TypeError as error:
-            raise DataValidationError(
-                "Invalid OrderItem: details of OrderItem contained bad or no data"
-            )
+        data = self.validator(data)
+        self.item_id = data["item_id"]
+        self.item_name = data["item_name"]
+        self.item_qty = data["item_qty"]
+        self.item_price = data["item_price"]
         return self
 
+    def create(self):
+        """
+        Adds the item to the Order of its order_id
+
+        Like save() and delete(), the totals and version of the Order are
+        updated by Order.items_changed() without loading its other items
+        """
+        logger.info("Adding item %s to order %s", self.item_id, self.order_id)
+        db.session.add(self)
+        self._commit_item_change()
+
     def delete(self):
         """ Removes an Item from the order"""
         logger.info("Deleting an item from order %s", self.order_id)
-        
         db.session.delete(self)
-        db.session.commit()
+        self._commit_item_change()
 
     def save(self):
         """
         Updates an item in an Order to the database
         """
         logger.info("Saving item in order :: %s", self.item_id)
-        db.session.commit()
+        self._commit_item_change()
+
+    def _commit_item_change(self):
+        """ Writes the pending change of the item and the new totals of its Order """
+        order_id = self.order_id
+        try:
+            db.session.flush()
+            Order.items_changed(order_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        Order.cache.delete(order_id)
 
     @classmethod
     def all(cls):
@@ -96,6 +183,21 @@ class OrderItem(db.Model):
         logger.info("Processing all OrderItems")
         return cls.query.all()
 
+    @classmethod
+    def find(cls, order_id, by_id):
+        """
+        Finds an item of an Order by its id
+
+        The item is looked up by primary key, so the other items of the
+        Order are never loaded. Returns None if the item does not exist or
+        belongs to another Order.
+        """
+        logger.info("Processing lookup for item id %s in order %s ...", by_id, order_id)
+        item = cls.query.get(by_id)
+        if item is None or item.order_id != order_id:
+            return None
+        return item
+
     @classmethod
     def find_by_item(cls,item_id):
         """Returns all orders containing the specified item id"""
@@ -113,38 +215,193 @@ class Order(db.Model):
     """
 
     app = None
+    # Payload validator compiled from create_order_model, which builds the
+    # OrderItems of the payload while it checks them. New Orders are always
+    # Received, so the status the model documents may be left out
+    validator = staticmethod(compile_model(create_order_model, {"OrderItem": OrderItem},
+                                           optional=("status",)))
+    # Serialized Orders by id, replaced from the app config in init_db()
+    cache = LRUCache()
 
     # Table Schema
     id = db.Column(db.Integer, primary_key=True) #Order ID
-    cust_id  = db.Column(db.Integer)             #Customer ID for the order
+    cust_id  = db.Column(db.Integer, index=True) #Customer ID for the order
     order_items = db.relationship('OrderItem', backref='order', lazy = True, \
         cascade = "all,delete") #Items in the order
     status = db.Column(db.Enum(OrderStatus), nullable=False, server_default=(OrderStatus.Received.name)) # status of the order
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1") # bumped on every write
+    # kept in step with order_items by every write so totals need no item rows
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    total_amount = db.Column(db.Float, nullable=False, default=0.0, server_default="0")
+
+    # bump_version() sets the next version, and SQLAlchemy only applies an
+    # UPDATE while the row still has the version that was loaded
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
 
     def __repr__(self):
         return "<Order id=[%s] placed by cust_id=[%s]>" % (self.id, self.cust_id)
 
-    def create(self):
+    def create(self, idempotency_key=None):
         """
         Creates an Order to the database
+
+        Args:
+            idempotency_key (IdempotencyKey): stored with the serialized Order
+                in the same transaction, so a retry can replay the response
         """
         logger.info("Creating order for customer :: %s", self.cust_id)
         self.id = None  # id must be none to generate next primary key
+        self.update_totals()
         db.session.add(self)
-        db.session.commit()
+        try:
+            if idempotency_key is not None:
+                db.session.flush()  # assigns the id the stored response needs
+                idempotency_key.order_id = self.id
+                idempotency_key.response = self.serialize()
+                idempotency_key.created_at = datetime.utcnow()
+                # replaces an expired row with the same key that was not purged yet
+                db.session.merge(idempotency_key)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if idempotency_key is not None:
+            IdempotencyKey.cache.set(idempotency_key.key, idempotency_key.serialize())
+
+    @classmethod
+    def create_many(cls, orders):
+        """
+        Creates a batch of Orders and their items in a single transaction
+
+        On PostgreSQL the ids are taken from the sequence of order.id in one
+        query and the Orders are written with explicit ids in one multi-row
+        INSERT, so no id depends on the order of returned rows. All of their
+        items go in one executemany INSERT. The ids are assigned back to the
+        Orders.
+
+        Args:
+            orders (list): deserialized Orders that are not in the session yet
+        """
+        logger.info("Creating %d orders in bulk", len(orders))
+        if not orders:
+            return []
+        order_table = cls.__table__
+        for order in orders:
+            order.update_totals()
+        rows = [
+            {
+                "cust_id": order.cust_id,
+                "status": order.status or OrderStatus.Received,
+                "item_count": order.item_count,
+                "total_amount": order.total_amount,
+            }
+            for order in orders
+        ]
+        try:
+            if db.engine.dialect.name == "postgresql":
+                result = db.session.execute(
+                    text("SELECT nextval(pg_get_serial_sequence('\"order\"', 'id')) "
+                         "FROM generate_series(1, :count)"),
+                    {"count": len(rows)},
+                )
+                order_ids = sorted(row[0] for row in result)
+                for row, order_id in zip(rows, order_ids):
+                    row["id"] = order_id
+                db.session.execute(order_table.insert().values(rows))
+            else:
+                # no RETURNING support so each order row reports its own key
+                order_ids = [
+                    db.session.execute(order_table.insert(), row).inserted_primary_key[0]
+                    for row in rows
+                ]
+            item_rows = [
+                {
+                    "order_id": order_id,
+                    "item_id": item.item_id,
+                    "item_name": item.item_name,
+                    "item_qty": item.item_qty,
+                    "item_price": item.item_price,
+                }
+                for order, order_id in zip(orders, order_ids)
+                for item in order.order_items
+            ]
+            if item_rows:
+                db.session.execute(OrderItem.__table__.insert(), item_rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for order, order_id in zip(orders, order_ids):
+            order.id = order_id
+        return order_ids
 
     def save(self):
         """
         Updates an Order to the database
         """
         logger.info("Saving order for customer :: %s", self.cust_id)
+        # items can only have been changed through a loaded collection, so
+        # an unloaded one is never read just to recompute the same totals
+        if "order_items" not in inspect(self).unloaded:
+            self.update_totals()
+        self.bump_version()
         db.session.commit()
+        Order.cache.delete(self.id)
 
     def delete(self):
         """ Removes an Order from the data store """
         logger.info("Deleting order for customer :: %s", self.cust_id)
+        order_id = self.id
         db.session.delete(self)
         db.session.commit()
+        Order.cache.delete(order_id)
+
+    def bump_version(self):
+        """ Marks the Order and its items as changed by the current transaction """
+        self.version = (self.version or 0) + 1
+
+    @classmethod
+    def items_changed(cls, order_id):
+        """
+        Recomputes the totals and bumps the version of an Order in SQL
+
+        Used after one item of the Order was added, changed or deleted: the
+        count and sum are aggregated by the database over the order_id index,
+        so no item rows are loaded. On PostgreSQL the Order row is locked
+        first, so the aggregates see the items committed by concurrent writers.
+        """
+        order_table = cls.__table__
+        if db.engine.dialect.name == "postgresql":
+            # FOR NO KEY UPDATE does not wait for the key share lock of item inserts
+            db.session.query(cls.id).filter(cls.id == order_id).with_for_update(key_share=True).first()
+        db.session.execute(order_table.update().where(order_table.c.id == order_id).values(
+            version=order_table.c.version + 1, **cls.totals_of(order_id)
+        ))
+
+    @classmethod
+    def totals_of(cls, order_id):
+        """
+        Returns the item_count and total_amount of an Order as SQL subqueries
+
+        Args:
+            order_id: the id of the Order, or the id column of the order
+                table to compute the totals of every Order in an UPDATE
+        """
+        item_table = OrderItem.__table__
+        in_order = item_table.c.order_id == order_id
+        return {
+            "item_count": select([func.count(item_table.c.id)]).where(in_order).as_scalar(),
+            "total_amount": select([
+                func.coalesce(func.sum(item_table.c.item_qty * item_table.c.item_price), 0.0),
+            ]).where(in_order).as_scalar(),
+        }
+
+    def update_totals(self):
+        """ Recomputes item_count and total_amount from the loaded items of the Order """
+        self.item_count = len(self.order_items)
+        self.total_amount = sum(
+            (item.item_qty or 0) * (item.item_price or 0.0) for item in self.order_items
+        )
 
     def serialize(self):
         """ Serializes an Order into a dictionary """
@@ -152,7 +409,10 @@ class Order(db.Model):
             "id": self.id, 
             "cust_id": self.cust_id,
             "order_items": [order_item.serialize() for order_item in self.order_items],
-            "status": self.status.name if self.status else None
+            "status": self.status.name if self.status else None,
+            "version": self.version,
+            "item_count": self.item_count,
+            "total_amount": self.total_amount
             }
 
     def deserialize(self, data):
@@ -162,65 +422,111 @@ class Order(db.Model):
         Args:
             data (dict): A dictionary containing the order data
         """
-        try:    
-            self.cust_id = int(data["cust_id"])
-            order_items = data["order_items"]
-            for order_item in order_items:
-                try:  
-                    item_id = int(order_item['item_id'])
-                except ValueError as error:
-                    raise DataValidationError("Invalid Order:item_id must be int " + error.args[0])  
-                item_name = str(order_item['item_name'])
-                if not item_name:
-                    raise DataValidationError("Invalid Order:item_name must exist ")
-                try:  
-                    item_qty = int(order_item['item_qty'])
-                except ValueError as error:
-                    raise DataValidationError("Invalid Order:item_qty must be int " + error.args[0])
-                try:  
-                    item_price = float(order_item['item_price'])
-                except ValueError as error:
-                    raise DataValidationError("Invalid Order:item_price must be float " + error.args[0])
-                self.order_items.append(OrderItem(item_id = item_id , \
-                    item_name = item_name , item_qty = item_qty, \
-                    item_price = item_price ))
-
-        except KeyError as error:
-            raise DataValidationError(
-                "Invalid Order: missing " + error.args[0]
-            )
-        except TypeError as error:
-            raise DataValidationError(
-                "Invalid Order: body of request contained bad or no data: " + error.args[0])
-        except  ValueError as error:
-                raise DataValidationError(
-                "Invalid Order: cust_id must be int " + error.args[0]
-            )
-
+        data = self.validator(data)
+        self.cust_id = data["cust_id"]
+        self.order_items.extend(data["order_items"])
         return self
 
     @classmethod
     def init_db(cls, app):
-        """ Initializes the database session """
+        """
+        Initializes the database session
+
+        Nothing is sent to the database here: the first connection is
+        opened by the first query, and the schema is created by create_db()
+        """
         logger.info("Initializing database")
         cls.app = app
+        cls.cache = LRUCache(
+            maxsize=app.config.get("ORDER_CACHE_SIZE", 1024),
+            ttl=app.config.get("ORDER_CACHE_TTL", 60.0),
+        )
+        IdempotencyKey.ttl = app.config.get("IDEMPOTENCY_KEY_TTL", IdempotencyKey.ttl)
+        IdempotencyKey.cache = LRUCache(
+            maxsize=app.config.get("IDEMPOTENCY_CACHE_SIZE", 1024),
+            ttl=IdempotencyKey.ttl,
+        )
+        # settings already in SQLALCHEMY_ENGINE_OPTIONS win over the pool config
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = dict(
+            engine_options(app.config), **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        )
         # This is where we initialize SQLAlchemy from the Flask app
         db.init_app(app)
         app.app_context().push()
-        db.create_all()  # make our sqlalchemy tables
+        profiling.init_app(app, db.engine)
+
+    @classmethod
+    def list_query(cls):
+        """
+        Returns a query over all Orders that batch loads their items
+
+        The items of every Order in the result are fetched with one extra
+        SELECT ... WHERE order_id IN (...) instead of one SELECT per Order
+        """
+        return cls.query.options(selectinload(cls.order_items))
 
     @classmethod
     def all(cls):
         """ Returns all of the Orders in the database """
         logger.info("Processing all Orders")
-        return cls.query.all()
+        return cls.list_query().all()
+
+    @classmethod
+    def stream(cls, batch_size=1000):
+        """
+        Returns an iterator over every Order in id order
+
+        Orders are fetched batch_size rows at a time through a server-side
+        cursor where the database supports one, so memory use does not grow
+        with the size of the table
+        """
+        logger.info("Streaming all Orders in batches of %d", batch_size)
+        return cls.list_query().order_by(cls.id).execution_options(
+            stream_results=True
+        ).yield_per(batch_size)
 
     @classmethod
     def find(cls, by_id):
         """ Finds a Order by it's ID """
         logger.info("Processing lookup for order id %s ...", by_id)
         return cls.query.get(by_id)
-        
+
+    @classmethod
+    def find_serialized(cls, by_id, version=None):
+        """
+        Returns the serialized Order with the id, or None if there is none
+
+        Reads through Order.cache, whose copy is only used while its version
+        is still the one in the database: the cache is kept per worker
+        process, so another worker may have changed the Order since
+
+        Args:
+            by_id (int): the id of the Order
+            version (int): its current version, if the caller already read it
+        """
+        data = cls.cache.get(by_id)
+        if data is not None:
+            if version is None:
+                version = cls.find_version(by_id)
+            if data["version"] == version:
+                return data
+        order = cls.find(by_id)
+        if order is None:
+            return None
+        data = order.serialize()
+        cls.cache.set(by_id, data)
+        return data
+
+    @classmethod
+    def find_version(cls, by_id):
+        """
+        Returns the version of the Order with the id, or None if there is none
+
+        Always read from the database, by primary key and without the items,
+        so ETags and 304 responses are current in every worker process
+        """
+        return db.session.query(cls.version).filter(cls.id == by_id).scalar()
+
     @classmethod
     def find_or_404(cls, by_id):
         """ Find a Order by it's id """
@@ -231,15 +537,217 @@ class Order(db.Model):
     def find_by_customer(cls, customer_id) :
         """Returns all orders for the specified customer ID"""
         logger.info("Finding all orders for the specified customer ID %s", customer_id)
-        return cls.query.filter(cls.cust_id == customer_id)
+        return cls.list_query().filter(cls.cust_id == customer_id)
+
+    @classmethod
+    def filter_query(cls, query, customer_id=None, item_id=None, order_status=None,
+                     min_id=None, max_id=None):
+        """
+        Narrows an Order query to the Orders that match all of the given filters
+
+        Every filter is a condition of the same WHERE clause: the customer is
+        looked up through ix_order_cust_id, the item through an IN (SELECT ...)
+        on ix_order_item_item_id_order_id, which needs no DISTINCT, and the id
+        range through the primary key.
+
+        Args:
+            customer_id (int): only Orders placed by this customer
+            item_id (int): only Orders containing this item
+            order_status (OrderStatus): only Orders in this status
+            min_id (int): only Orders with an id of at least this
+            max_id (int): only Orders with an id of at most this
+        """
+        if customer_id is not None:
+            query = query.filter(cls.cust_id == customer_id)
+        if item_id is not None:
+            query = query.filter(cls.id.in_(
+                db.session.query(OrderItem.order_id).filter(OrderItem.item_id == item_id)
+            ))
+        if order_status is not None:
+            query = query.filter(cls.status == order_status)
+        if min_id is not None:
+            query = query.filter(cls.id >= min_id)
+        if max_id is not None:
+            query = query.filter(cls.id <= max_id)
+        return query
+
+    @classmethod
+    def find_by_filters(cls, customer_id=None, item_id=None, order_status=None,
+                        min_id=None, max_id=None):
+        """Returns all orders that match all of the given filters (see filter_query)"""
+        logger.info("Finding all orders of customer %s with item %s in status %s and ids %s to %s",
+                    customer_id, item_id, order_status, min_id, max_id)
+        return cls.filter_query(cls.list_query(), customer_id, item_id, order_status, min_id, max_id)
+
+    @classmethod
+    def cancel_many(cls, customer_id=None, item_id=None, order_ids=None):
+        """
+        Cancels every Order that matches all of the given filters
+
+        Runs one UPDATE in the database without loading any Orders, bumps the
+        version of each cancelled Order and returns how many were cancelled.
+        Orders that are already cancelled are left alone.
+
+        Args:
+            customer_id (int): only Orders placed by this customer
+            item_id (int): only Orders containing this item
+            order_ids (list): only Orders with these ids
+        """
+        logger.info("Cancelling orders of customer %s with item %s and ids %s",
+                    customer_id, item_id, order_ids)
+        if order_ids is not None and not order_ids:
+            return 0
+        query = cls.filter_query(cls.query.filter(cls.status != OrderStatus.Cancelled),
+                                 customer_id=customer_id, item_id=item_id)
+        if order_ids is not None:
+            query = query.filter(cls.id.in_(order_ids))
+        try:
+            count = query.update(
+                {cls.status: OrderStatus.Cancelled, cls.version: cls.version + 1},
+                synchronize_session=False,
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        # the cancelled ids are never loaded, so drop every cached Order
+        cls.cache.clear()
+        return count
+
+    @classmethod
+    def customer_summary(cls, customer_id):
+        """
+        Returns the order counts, total spend and last order of a customer
+
+        Everything is computed by one aggregate query over the orders of
+        find_by_customer(), so no order rows are loaded. Cancelled orders are
+        counted but left out of the total spend.
+        """
+        logger.info("Summarizing the orders of customer ID %s", customer_id)
+        row = cls.find_by_customer(customer_id).with_entities(
+            func.count(cls.id),
+            func.coalesce(func.sum(case(
+                [(cls.status != OrderStatus.Cancelled, cls.total_amount)], else_=0.0
+            )), 0.0),
+            func.max(cls.id),
+            *[func.coalesce(func.sum(case([(cls.status == order_status, 1)], else_=0)), 0)
+              for order_status in OrderStatus]
+        ).one()
+        order_count, total_spend, last_order_id = row[:3]
+        return {
+            "cust_id": customer_id,
+            "order_count": order_count,
+            "orders_by_status": {
+                order_status.name: count for order_status, count in zip(OrderStatus, row[3:])
+            },
+            "total_spend": total_spend,
+            "last_order_id": last_order_id,
+        }
 
     @classmethod
     def find_by_item(cls, item_id):
         """Returns all orders for the specified item ID"""
         logger.info("Finding all orders for the specified item ID %s", item_id)
-        return cls.query.join(
-            OrderItem
-        ).filter(Order.id==OrderItem.order_id).filter(OrderItem.item_id==item_id).all()
+        return cls.filter_query(cls.list_query(), item_id=item_id)
 
+    @classmethod
+    def paginate(cls, query, after=None, limit=None):
+        """
+        Returns one page of Orders from a query using keyset pagination
+
+        Args:
+            query: the Order query to page through
+            after (int): only Orders with an id greater than this cursor are returned
+            limit (int): the maximum number of Orders to return
+        """
+        logger.info("Processing page of orders after id %s (limit %s)", after, limit)
+        if after is not None:
+            query = query.filter(cls.id > after)
+        return query.order_by(cls.id).limit(limit).all()
+
+
+class IdempotencyKey(db.Model):
+    """
+    Class that represents the stored response of an Order create
+
+    A client that retries a create with the same Idempotency-Key header gets
+    the stored response back instead of a second Order. Keys expire after
+    ttl seconds and are removed by purge_expired().
+    """
 
+    # Seconds a key is honoured and its cache, replaced from the app config in init_db()
+    ttl = 86400
+    cache = LRUCache()
 
+    key = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False) # sha256 of the request body
+    order_id = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.JSON, nullable=False) # the serialized Order as first returned
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return "<IdempotencyKey key=[%s] order_id=[%s]>" % (self.key, self.order_id)
+
+    def serialize(self):
+        """ Serializes an IdempotencyKey into a dictionary """
+        return {
+            "key": self.key,
+            "request_hash": self.request_hash,
+            "order_id": self.order_id,
+            "response": self.response,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def expired_before(cls):
+        """ Returns the creation time before which keys have expired """
+        return datetime.utcnow() - timedelta(seconds=cls.ttl)
+
+    @classmethod
+    def find(cls, key):
+        """
+        Returns the serialized IdempotencyKey for key, or None if it is unknown or expired
+
+        Keys are read through the cache, so a retry usually costs no query
+        """
+        entry = cls.cache.get(key)
+        if entry is None:
+            logger.info("Processing lookup for idempotency key %s ...", key)
+            row = cls.query.get(key)
+            if row is None:
+                return None
+            entry = row.serialize()
+            cls.cache.set(key, entry)
+        if entry["created_at"] < cls.expired_before():
+            cls.cache.delete(key)
+            return None
+        return entry
+
+    @classmethod
+    def purge_expired(cls, batch_size=1000):
+        """
+        Deletes the expired keys in batches and returns how many were deleted
+
+        Each batch is its own short transaction, so a large backlog does not
+        hold locks on the table for long
+        """
+        cutoff = cls.expired_before()
+        purged = 0
+        while True:
+            keys = [
+                row.key for row in db.session.query(cls.key)
+                .filter(cls.created_at < cutoff)
+                .order_by(cls.created_at)
+                .limit(batch_size)
+            ]
+            if not keys:
+                break
+            cls.query.filter(cls.key.in_(keys)).delete(synchronize_session=False)
+            db.session.commit()
+            for key in keys:
+                cls.cache.delete(key)
+            purged += len(keys)
+            logger.info("Purged %d expired idempotency keys", len(keys))
+            if len(keys) < batch_size:
+                break
+        return purged
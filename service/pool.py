@@ -0,0 +1,83 @@
+"""
+Module: pool
+
+Database connection pool settings and statistics.
+
+Every worker process owns one pool. Size it so that
+workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays under the connection limit
+of the database plan.
+"""
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool that records how long checkouts wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.timeouts += timed_out
+                self.wait_time += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    def stats(self):
+        """Returns the live state and the checkout wait times of the pool"""
+        with self._stats_lock:
+            return {
+                "pool": type(self).__name__,
+                "size": self.size(),
+                "checked_out": self.checkedout(),
+                "checked_in": self.checkedin(),
+                "overflow": max(self.overflow(), 0),
+                "max_overflow": self._max_overflow,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_time_total": round(self.wait_time, 6),
+                "wait_time_max": round(self.max_wait, 6),
+            }
+
+
+def engine_options(config):
+    """
+    Returns the SQLAlchemy engine options for the pool settings in config
+
+    SQLite keeps the pool SQLAlchemy picks for it, since its pools take none
+    of these settings
+    """
+    if config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+    }
+
+
+def pool_stats(pool):
+    """Returns the statistics of any SQLAlchemy pool"""
+    if isinstance(pool, TimedQueuePool):
+        return pool.stats()
+    return {"pool": type(pool).__name__, "status": pool.status()}
@@ -0,0 +1,106 @@
+"""
+Module: profiling
+
+SQL statement profiling for the order service.
+
+Event hooks on the database engine time every statement and charge it to
+the request being served, so g.db_queries and g.db_time always hold the SQL
+work of the current request. Statements slower than SLOW_QUERY_THRESHOLD_MS
+are written with their parameters to the "flask.app.slow_query" logger.
+With SQL_PROFILING_HEADERS set, every response reports its query count and
+database time in the X-DB-Query-Count and Server-Timing headers, which makes
+a regression like one SELECT per order show up at the first request.
+
+Streamed responses report the statements run before the body started.
+"""
+import logging
+import time
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+slow_query_logger = logging.getLogger("flask.app.slow_query")
+
+# longest parameter list written to the slow query log
+MAX_LOGGED_PARAMETERS = 1000
+
+
+def init_app(app, engine):
+    """Profiles the statements sent through engine for the requests of app"""
+    if "sql_profiling" not in app.extensions:
+        app.before_request(start_request_profile)
+        app.after_request(add_profile_headers)
+        app.extensions["sql_profiling"] = True
+    if not event.contains(engine, "before_cursor_execute", start_statement_timer):
+        event.listen(engine, "before_cursor_execute", start_statement_timer)
+        event.listen(engine, "after_cursor_execute", record_statement)
+        event.listen(engine, "handle_error", discard_statement_timer)
+
+
+def format_parameters(parameters):
+    """Returns the parameters of a statement cut down to a loggable size"""
+    text = repr(parameters)
+    if len(text) > MAX_LOGGED_PARAMETERS:
+        text = text[:MAX_LOGGED_PARAMETERS] + "..."
+    return text
+
+
+######################################################################
+# Request hooks
+######################################################################
+def start_request_profile():
+    """Starts the SQL counters of a request"""
+    g.db_queries = 0
+    g.db_time = 0.0
+
+
+def add_profile_headers(response):
+    """Reports the SQL work of the request when SQL_PROFILING_HEADERS is set"""
+    if current_app.config.get("SQL_PROFILING_HEADERS") and "db_queries" in g:
+        response.headers["X-DB-Query-Count"] = str(g.db_queries)
+        response.headers.add(
+            "Server-Timing", 'db;dur={:.3f};desc="{} queries"'.format(g.db_time * 1000, g.db_queries)
+        )
+    return response
+
+
+######################################################################
+# Engine hooks
+######################################################################
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    """Remembers when a SQL statement started"""
+    conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    """Charges a finished SQL statement to the current request and logs it if slow"""
+    elapsed = time.perf_counter() - conn.info["statement_start"].pop()
+    in_request = has_request_context()
+    if in_request and "db_queries" in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+    if not has_app_context():
+        return
+    log_slow_statement(
+        current_app.config, elapsed,
+        "{} {}".format(request.method, request.path) if in_request else "no request",
+        statement, parameters,
+    )
+
+
+def log_slow_statement(config, elapsed, where, statement, parameters):
+    """Logs a statement that took at least SLOW_QUERY_THRESHOLD_MS, with its parameters"""
+    threshold = config.get("SLOW_QUERY_THRESHOLD_MS")
+    if threshold is not None and elapsed * 1000 >= threshold:
+        slow_query_logger.warning(
+            "Slow query took %.1f ms in %s: %s parameters=%s",
+            elapsed * 1000,
+            where,
+            " ".join(statement.split()),
+            format_parameters(parameters),
+        )
+
+
+def discard_statement_timer(context):
+    """Forgets the start time of a SQL statement that failed"""
+    if context.connection is not None and context.connection.info.get("statement_start"):
+        context.connection.info["statement_start"].pop()
@@ -9,17 +9,20 @@ GET / - Displays a UI for Selenium testing
 # and order items
 """
 
-from flask import jsonify, request, url_for, make_response, abort
+import hashlib
+import json
+from flask import jsonify, request, make_response, abort, Response, stream_with_context
 from flask_restx import Api, Resource, fields, reqparse, inputs
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from werkzeug.exceptions import NotFound
-from service.models import Order, OrderStatus
+from werkzeug.http import quote_etag
+from service.models import Order, OrderItem, OrderStatus, DataValidationError, IdempotencyKey, db
+from service.compression import etag_variants, matching_variant
+from service.pool import pool_stats
+from service import validation
 from . import status  # HTTP Status Codes
 
-# For this example we'll use SQLAlchemy, a popular ORM that supports a
-# variety of backends including SQLite, MySQL, and PostgreSQL
-from flask_sqlalchemy import SQLAlchemy
-from service.models import Order, OrderItem, DataValidationError
-
 # Import Flask application
 from . import app
 
@@ -31,6 +34,22 @@ def index():
     """ Root URL response """
     return app.send_static_file("index.html")
 
+######################################################################
+# GET CACHE STATISTICS
+######################################################################
+@app.route("/stats/cache")
+def cache_stats():
+    """ Returns the size and hit/miss counters of the order cache """
+    return jsonify(Order.cache.stats()), status.HTTP_200_OK
+
+######################################################################
+# GET CONNECTION POOL STATISTICS
+######################################################################
+@app.route("/stats/pool")
+def connection_pool_stats():
+    """ Returns the state and checkout wait times of the connection pool """
+    return jsonify(pool_stats(db.engine.pool)), status.HTTP_200_OK
+
 ######################################################################
 # Configure Swagger before initializing it
 ######################################################################
@@ -46,18 +65,8 @@ api = Api(app,
 
 
 
-# Define the OrderItem model so that the docs reflect what can be sent
-create_item_model = api.model('OrderItem', {
-    'item_id': fields.Integer(required=True,
-                              description='The product ID that identifies the item'),
-    'item_name': fields.String(required=True,
-                               description='The name of the item'),
-    'item_qty': fields.Integer(required=True,
-                                description='Quantity for the item'),
-    'item_price': fields.Float(required=True,
-                              description='Price of the item'),     
-
-})
+# The payload models are defined next to their validators in service.validation
+create_item_model = api.add_model('OrderItem', validation.create_item_model)
 
 item_model = api.inherit(
     'OrderItemModel',
@@ -68,19 +77,15 @@ item_model = api.inherit(
 
         'order_id' : fields.Integer(readOnly=True,
                                   description='The order id that the item corresponds to'),
+        'version': fields.Integer(readOnly=True,
+                                  description='Incremented on every change to the item'),
                                           
     }
 )
 
-# Define the order model so that the docs reflect what can be sent
-create_order_model = api.model('Order', {
-    'cust_id': fields.Integer(required=True,
-                          description='Customer ID for the customer who placed the order'),
-    'status': fields.String(required=True,
-                              description='Status of the order', enum = ['Received', 'Processing', 'Cancelled']),
-    'order_items': fields.List(fields.Nested(create_item_model, required=True), required=True,
-                               description='Items in the Order')
-})
+# Handlers return Order.serialize()/OrderItem.serialize() as is, without a
+# second marshal pass, so those dicts must keep exactly these fields.
+create_order_model = api.add_model('Order', validation.create_order_model)
 
 order_model = api.inherit(
     'OrderModel',     
@@ -92,14 +97,63 @@ order_model = api.inherit(
         'status': fields.String(required=True,
                               description='Status of the order', enum = ['Received', 'Processing', 'Cancelled']),
         'order_items': fields.List(fields.Nested(item_model, required=True), required=True,
-                               description='Items in the Order')        
+                               description='Items in the Order'),
+        'version': fields.Integer(readOnly=True,
+                              description='Incremented on every change to the Order or its items'),
+        'item_count': fields.Integer(readOnly=True,
+                              description='Number of items in the Order'),
+        'total_amount': fields.Float(readOnly=True,
+                              description='Sum of item_qty * item_price over the items of the Order')
     }
 )
 
+# Define the per-entry result of a batch create
+batch_result_model = api.model('OrderBatchResult', {
+    'id': fields.Integer(description='The id of the created order'),
+    'location': fields.String(description='The URL of the created order'),
+    'error': fields.String(description='Why the entry was rejected'),
+})
+
+# Define the aggregate view of the orders of one customer
+customer_summary_model = api.model('CustomerSummary', {
+    'cust_id': fields.Integer(description='Customer ID the summary is for'),
+    'order_count': fields.Integer(description='Number of Orders placed by the customer'),
+    'orders_by_status': fields.Nested(
+        api.model('OrderStatusCounts', {
+            order_status.name: fields.Integer(description='Orders with status ' + order_status.name)
+            for order_status in OrderStatus
+        }),
+        description='Number of Orders in each status'),
+    'total_spend': fields.Float(description='Sum of total_amount over the Orders that are not cancelled'),
+    'last_order_id': fields.Integer(description='Id of the most recent Order, null without Orders'),
+})
+
+# Define the filter of a bulk cancel; an Order must match every field given
+cancel_filter_model = api.model('OrderCancelFilter', {
+    'cust_id': fields.Integer(description='Cancel the Orders of this customer'),
+    'item_id': fields.Integer(description='Cancel the Orders containing this item'),
+    'ids': fields.List(fields.Integer, description='Cancel the Orders with these ids'),
+})
+
+cancel_result_model = api.model('OrderCancelResult', {
+    'cancelled': fields.Integer(description='Number of Orders that were cancelled'),
+})
+
 # query string arguments
 order_args = reqparse.RequestParser()
 order_args.add_argument('cust_id', type=int, location='args', required=False, help='List Orders by cust_id')
 order_args.add_argument('item_id', type=int, location='args', required=False, help='List Orders by item_id')
+order_args.add_argument('status', type=str, location='args', required=False,
+                        choices=[order_status.name for order_status in OrderStatus],
+                        help='List Orders by status')
+order_args.add_argument('min_id', type=inputs.natural, location='args', required=False,
+                        help='Only return Orders with an id of at least this')
+order_args.add_argument('max_id', type=inputs.natural, location='args', required=False,
+                        help='Only return Orders with an id of at most this')
+order_args.add_argument('limit', type=inputs.int_range(1, app.config['MAX_PAGE_SIZE']), location='args',
+                        required=False, help='Maximum number of Orders to return')
+order_args.add_argument('after', type=inputs.natural, location='args', required=False,
+                        help='Cursor: only return Orders with an id greater than this')
 ######################################################################
 # Special Error Handlers
 ######################################################################
@@ -114,6 +168,29 @@ def request_validation_error(error):
         'message': message
     }, status.HTTP_400_BAD_REQUEST
 
+@api.errorhandler(StaleDataError)
+def stale_data_error(error):
+    """
+    Handles writes that lost the race against a concurrent write
+
+    Only a request that sent If-Match asked for the precondition, so it gets
+    412; any other request gets 409 and may simply be retried
+    """
+    db.session.rollback()
+    message = "The resource was changed by another request: {}".format(error)
+    app.logger.warning(message)
+    if 'If-Match' in request.headers:
+        return {
+            'status_code': status.HTTP_412_PRECONDITION_FAILED,
+            'error': 'Precondition Failed',
+            'message': message
+        }, status.HTTP_412_PRECONDITION_FAILED
+    return {
+        'status_code': status.HTTP_409_CONFLICT,
+        'error': 'Conflict',
+        'message': message
+    }, status.HTTP_409_CONFLICT
+
 ######################################################################
 
 ######################################################################
@@ -134,18 +211,27 @@ class OrderResource(Resource):
     # RETRIEVE AN ORDER
     # ------------------------------------------------------------------
     @api.doc('get_order')
+    @api.response(200, 'Success', order_model)
+    @api.response(304, 'Order not modified')
     @api.response(404, 'Order not found')
-    @api.marshal_with(order_model)
     def get(self, order_id):
         """
         Retrieve a single order
-        This endpoint will return an Order based on it's id
+        This endpoint will return an Order based on it's id.
+        The response carries an ETag; send it back in If-None-Match to get
+        a 304 Not Modified while the Order is unchanged.
         """
         app.logger.info("Request for order with id: %s", order_id)
-        order = Order.find(order_id)
+        version = Order.find_version(order_id)
+        if version is None:
+            abort(status.HTTP_404_NOT_FOUND, "Order was not found.")
+        etag = matching_etag(order_id, version)
+        if etag:
+            return not_modified(etag)
+        order = Order.find_serialized(order_id, version)
         if not order:
             abort(status.HTTP_404_NOT_FOUND, "Order was not found.")
-        return order.serialize(), status.HTTP_200_OK
+        return order, status.HTTP_200_OK, etag_header(order)
 
 
     #------------------------------------------------------------------
@@ -171,25 +257,32 @@ class OrderResource(Resource):
     # UPDATE AN EXISTING ORDER
     # ------------------------------------------------------------------
 
-    @api.doc('update_order')
+    @api.doc('update_order', params={'If-Match': {
+        'in': 'header', 'type': 'string', 'description': 'Only update the Order if its ETag still matches'}})
     @api.response(404, 'Order not found')
     @api.response(400, 'The posted Order data was not valid')
+    @api.response(409, 'The Order was changed by a concurrent request; retry it')
+    @api.response(412, 'The Order was changed since the ETag in If-Match was read')
     @api.expect(order_model)
-    @api.marshal_with(order_model)
+    @api.response(200, 'Success', order_model)
     def put(self, order_id):
         """
         Update a Order
-        This endpoint will update a Order based the body that is posted
+        This endpoint will update a Order based the body that is posted.
+        Send the ETag of the Order in If-Match to only update the version
+        that was read; a concurrent change makes the update fail with 412.
         """
         app.logger.info('Request to Update a order with id [%s]', order_id)
         order = Order.find(order_id)
         if not order:
             abort(status.HTTP_404_NOT_FOUND, "Order with id '{}' was not found.".format(order_id))
+        check_if_match(order_etag(order.id, order.version))
         app.logger.debug('Payload = %s', api.payload)
         data = api.payload
         order.cust_id = data["cust_id"]
         order.save()
-        return order.serialize(), status.HTTP_200_OK
+        result = order.serialize()
+        return result, status.HTTP_200_OK, etag_header(result)
 
 
 ######################################################################
@@ -204,53 +297,216 @@ class OrderCollection(Resource):
     ######################################################################
     @api.doc('list_orders')
     @api.expect(order_args, validate=True)
-    @api.marshal_list_with(order_model)
+    @api.response(200, 'Success', [order_model])
     def get(self):
         """
             Lists orders
-            This endpoint will returns all orders
+            This endpoint will return one page of orders ordered by id.
+            The cust_id, item_id, status, min_id and max_id filters can be
+            combined; only orders matching all of them are returned.
+            When more orders exist, a Link header with rel="next" holds the
+            URL of the next page.
         """
         app.logger.info("Request for order list")
-        orders = []
         args = order_args.parse_args()
-        if args['cust_id']:
-            app.logger.info('Filtering by cust_id: %s', args['cust_id'])
-            orders = Order.find_by_customer(args['cust_id'])
-        elif args['item_id']:
-            app.logger.info('Filtering by item_id: %s', args['item_id'])
-            orders = Order.find_by_item(args['item_id'])
-        else:
-            app.logger.info("List all orders")
-            orders = Order.all()
+        limit = args['limit'] or app.config['DEFAULT_PAGE_SIZE']
+        query = Order.find_by_filters(
+            customer_id=args['cust_id'],
+            item_id=args['item_id'],
+            order_status=OrderStatus[args['status']] if args['status'] else None,
+            min_id=args['min_id'],
+            max_id=args['max_id'],
+        )
+        # fetch one extra row to find out if there is a next page
+        orders = Order.paginate(query, after=args['after'], limit=limit + 1)
+        headers = {}
+        if len(orders) > limit:
+            orders = orders[:limit]
+            headers['Link'] = next_page_link(args, limit, orders[-1].id)
         results = [order.serialize() for order in orders]
         app.logger.info("Returning %d orders", len(results))
-        return results, status.HTTP_200_OK
+        return results, status.HTTP_200_OK, headers
 
     
     #------------------------------------------------------------------
     # CREATE AN ORDER
     #------------------------------------------------------------------
-    @api.doc('create_order')
+    @api.doc('create_order', params={'Idempotency-Key': {
+        'in': 'header', 'type': 'string',
+        'description': 'Retries with the same key return the first response instead of a new Order'}})
     @api.response(400, 'The posted data was not valid')
+    @api.response(409, 'The Idempotency-Key was already used with a different body')
     @api.expect(create_order_model)
-    @api.marshal_with(order_model, code=201)
+    @api.response(201, 'Order created', order_model)
     def post(self):
         """
         Creates an Order
-        This endpoint will create an Order based the data in the body that is posted
+        This endpoint will create an Order based the data in the body that is posted.
+        A request that repeats the Idempotency-Key of an earlier one gets the
+        stored response of that request back.
         """
         app.logger.info('Request to Create an Order')
 
         check_content_type("application/json")
+        key = request.headers.get('Idempotency-Key')
+        idempotency_key = None
+        if key is not None:
+            if not key or len(key) > 255:
+                raise DataValidationError("Invalid Idempotency-Key: must be 1 to 255 characters")
+            request_hash = hashlib.sha256(
+                json.dumps(api.payload, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+            stored = IdempotencyKey.find(key)
+            if stored:
+                return replay_order_create(stored, request_hash)
+            idempotency_key = IdempotencyKey(key=key, request_hash=request_hash)
         order = Order()
         app.logger.debug('Payload = %s', api.payload)
         order.deserialize(api.payload)
-        order.create()        
+        try:
+            order.create(idempotency_key)
+        except IntegrityError:
+            # a concurrent request with the same key committed first
+            stored = IdempotencyKey.find(key) if key is not None else None
+            if not stored:
+                raise
+            return replay_order_create(stored, request_hash)
         app.logger.info("Order with ID [%s] created.", order.id)
         location_url = api.url_for(OrderResource, order_id=order.id, _external=True)
         return order.serialize(), status.HTTP_201_CREATED, {'Location': location_url}
 
 
+######################################################################
+#  PATH: /orders/export
+######################################################################
+@api.route('/orders/export', strict_slashes=False)
+class OrderExport(Resource):
+    """ Streams every Order for bulk consumers """
+
+    #------------------------------------------------------------------
+    # EXPORT ALL ORDERS
+    #------------------------------------------------------------------
+    @api.doc('export_orders')
+    @api.produces(['application/x-ndjson'])
+    @api.response(200, 'One JSON encoded Order per line', order_model)
+    def get(self):
+        """
+        Export all Orders
+        This endpoint will stream every Order as newline delimited JSON
+        without holding the whole table in memory
+        """
+        app.logger.info("Request to export all orders")
+        batch_size = app.config['EXPORT_BATCH_SIZE']
+
+        def generate():
+            for order in Order.stream(batch_size):
+                yield json.dumps(order.serialize()) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+######################################################################
+#  PATH: /orders:batch
+######################################################################
+@api.route('/orders:batch', strict_slashes=False)
+class OrderBatchCollection(Resource):
+    """ Handles creating Orders in bulk """
+
+    #------------------------------------------------------------------
+    # CREATE A BATCH OF ORDERS
+    #------------------------------------------------------------------
+    @api.doc('create_orders_batch')
+    @api.response(400, 'None of the posted Orders were valid')
+    @api.expect([create_order_model])
+    @api.response(201, 'Orders created', [batch_result_model])
+    def post(self):
+        """
+        Creates a batch of Orders
+        This endpoint will create every valid Order in the posted list in one
+        transaction and return, in the same order, the id or the error of each entry
+        """
+        app.logger.info('Request to Create a batch of Orders')
+
+        check_content_type("application/json")
+        payload = api.payload
+        if not isinstance(payload, list):
+            raise DataValidationError("Invalid batch: body of request must be a list of Orders")
+        if len(payload) > app.config['MAX_BATCH_SIZE']:
+            raise DataValidationError(
+                "Invalid batch: at most {} Orders can be created at once".format(app.config['MAX_BATCH_SIZE'])
+            )
+        orders = []
+        results = []
+        for entry in payload:
+            try:
+                order = Order().deserialize(entry)
+            except DataValidationError as error:
+                results.append({'id': None, 'location': None, 'error': str(error)})
+            else:
+                orders.append(order)
+                results.append(order)
+        Order.create_many(orders)
+        results = [
+            {
+                'id': result.id,
+                'location': api.url_for(OrderResource, order_id=result.id, _external=True),
+                'error': None,
+            } if isinstance(result, Order) else result
+            for result in results
+        ]
+        app.logger.info("Created %d of %d Orders in batch", len(orders), len(payload))
+        if not orders:
+            return results, status.HTTP_400_BAD_REQUEST
+        return results, status.HTTP_201_CREATED
+
+
+######################################################################
+#  PATH: /orders:cancel
+######################################################################
+@api.route('/orders:cancel', strict_slashes=False)
+class OrderCancelCollection(Resource):
+    """ Handles cancelling Orders in bulk """
+
+    #------------------------------------------------------------------
+    # CANCEL ALL ORDERS MATCHING A FILTER
+    #------------------------------------------------------------------
+    @api.doc('cancel_orders_bulk')
+    @api.response(400, 'The posted filter was not valid')
+    @api.expect(cancel_filter_model)
+    @api.response(200, 'Orders cancelled', cancel_result_model)
+    def post(self):
+        """
+        Cancels every Order matching a filter
+        This endpoint will cancel, with one UPDATE, every Order that matches all
+        of cust_id, item_id and ids given in the body and return how many were cancelled
+        """
+        app.logger.info('Request to cancel Orders in bulk')
+
+        check_content_type("application/json")
+        payload = api.payload
+        if not isinstance(payload, dict):
+            raise DataValidationError("Invalid filter: body of request must be an object")
+        unknown = set(payload) - {'cust_id', 'item_id', 'ids'}
+        if unknown:
+            raise DataValidationError("Invalid filter: unknown fields " + ", ".join(sorted(unknown)))
+        if not any(payload.get(name) is not None for name in ('cust_id', 'item_id', 'ids')):
+            raise DataValidationError("Invalid filter: give at least one of cust_id, item_id or ids")
+        for name in ('cust_id', 'item_id'):
+            if payload.get(name) is not None and not is_int(payload[name]):
+                raise DataValidationError("Invalid filter: {} must be int".format(name))
+        ids = payload.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(is_int(order_id) for order_id in ids):
+                raise DataValidationError("Invalid filter: ids must be a list of int")
+            if len(ids) > app.config['MAX_BATCH_SIZE']:
+                raise DataValidationError(
+                    "Invalid filter: at most {} ids can be given".format(app.config['MAX_BATCH_SIZE'])
+                )
+        count = Order.cancel_many(payload.get('cust_id'), payload.get('item_id'), ids)
+        app.logger.info("Cancelled %d Orders", count)
+        return {'cancelled': count}, status.HTTP_200_OK
+
+
 ######################################################################
 #  PATH: /orders/<int:order_id>/items
 ######################################################################
@@ -262,29 +518,36 @@ class OrderItemCollection(Resource):
     # LIST ALL ITEMS IN AN ORDER
     ######################################################################
     @api.doc('list_items_in_order')
-    @api.marshal_with(item_model)
+    @api.response(200, 'Success', [item_model])
+    @api.response(304, 'Order not modified')
+    @api.response(404, 'Order not found')
     def get(self, order_id):
         """
         List all items in an order
-        This endpoint will a list of all items in an Order based on it's order_id
+        This endpoint will a list of all items in an Order based on it's order_id.
+        The response carries the ETag of the Order for conditional requests.
         """
         app.logger.info("Request all items for order with id: %s", order_id)
-        order = Order.find(order_id)
+        version = Order.find_version(order_id)
+        if version is None:
+            raise NotFound("Order with id '{}' was not found.".format(order_id))
+        etag = matching_etag(order_id, version)
+        if etag:
+            return not_modified(etag)
+        order = Order.find_serialized(order_id, version)
         if not order:
             raise NotFound("Order with id '{}' was not found.".format(order_id))
-        items_list = []
-        for item in order.order_items:
-            items_list.append(item.serialize())
-        app.logger.info("Returning items in order: %s", order.id)
-        return items_list, status.HTTP_200_OK
+        app.logger.info("Returning items in order: %s", order_id)
+        return order['order_items'], status.HTTP_200_OK, etag_header(order)
         
     #------------------------------------------------------------------
     # ADD ITEM TO ORDER
     #------------------------------------------------------------------
     @api.doc('add_item')
     @api.response(400, 'The posted data was not valid')
+    @api.response(409, 'The item was changed by a concurrent request; retry it')
     @api.expect(create_item_model)
-    @api.marshal_with(item_model, code=201)
+    @api.response(201, 'Item added', item_model)
     def post(self, order_id):
         """
         Add an Item
@@ -298,11 +561,13 @@ class OrderItemCollection(Resource):
         order_item = OrderItem()
         app.logger.debug('Payload = %s', api.payload)
         order_item.deserialize(api.payload)
-        order.order_items.append(order_item)
-        order.save()    
+        order_item.order_id = order.id
+        order_item.create()
         app.logger.info("Item with ID [%s] added.", order_item.id)
         location_url = api.url_for(OrderItemResource, order_id=order.id, item_id = order_item.id, _external=True)
-        return order_item.serialize(), status.HTTP_201_CREATED, {'Location': location_url}
+        headers = item_etag_header(order_item)
+        headers['Location'] = location_url
+        return order_item.serialize(), status.HTTP_201_CREATED, headers
 
 
 
@@ -324,83 +589,62 @@ class OrderItemResource(Resource):
     # RETRIEVE AN ITEM IN AN ORDER
     # ------------------------------------------------------------------
     @api.doc('get_order_item')
+    @api.response(200, 'Success', item_model)
     @api.response(404, 'Item not found')
-    @api.marshal_with(item_model)
     def get(self, order_id, item_id):
         """
         Read an Item in an Order
         This endpoint will get an Item based on the order_id and item_id specified in the path
         """
         app.logger.info("Request to read an item in order %s with item_id: %s", order_id, item_id)
-        order = Order.find(order_id)
-
-        if not order:
-            abort(status.HTTP_404_NOT_FOUND, "Order was not found.")
-        item_found = False
-        item_obj = None
-        for item in order.order_items:
-            if item.id == item_id:
-                item_found = True
-                item_obj = item.serialize()
-                break
-        if not item_found:
+        item = OrderItem.find(order_id, item_id)
+        if not item:
             abort(status.HTTP_404_NOT_FOUND, "Item was not found.")
-        print(item_obj)
-        return item_obj, status.HTTP_200_OK
+        return item.serialize(), status.HTTP_200_OK, item_etag_header(item)
 
     # ------------------------------------------------------------------
     # UPDATE AN ITEM IN AN ORDER
     # ------------------------------------------------------------------
-    @api.doc('update_order_item')
+    @api.doc('update_order_item', params={'If-Match': {
+        'in': 'header', 'type': 'string', 'description': 'Only update the item if its ETag still matches'}})
     @api.response(404, 'Item not found')
     @api.response(400, 'The posted item data was not valid')
+    @api.response(409, 'The item was changed by a concurrent request; retry it')
+    @api.response(412, 'The item was changed since the ETag in If-Match was read')
     @api.expect(create_item_model)
-    @api.marshal_with(item_model)
+    @api.response(200, 'Success', item_model)
     def put(self, order_id, item_id):
         """
            Update an item in an Order
-           This endpoint will update an Order's item based the id that is posted
+           This endpoint will update an Order's item based the id that is posted.
+           Send the ETag of the item in If-Match to only update the version
+           that was read; a concurrent change makes the update fail with 412.
         """
         app.logger.info("Request to update the item id: %s in order id: %s", item_id, order_id)
-        order = Order.find(order_id)
-        if not order:
-            abort(status.HTTP_404_NOT_FOUND, "Order was not found.")
-        item_found = False
-        return_item = None
-        for item in order.order_items:
-            if item.id == item_id:
-                item_found = True
-                item.deserialize(request.get_json())
-                item.id = item_id
-                item.save()
-                order.save()
-                return_item = item
-                break
-        if not item_found:
+        item = OrderItem.find(order_id, item_id)
+        if not item:
             abort(status.HTTP_404_NOT_FOUND, "Item with id '{}' was not found.".format(item_id))
-        return return_item.serialize(), status.HTTP_200_OK
+        check_if_match(item_etag(item))
+        item.deserialize(request.get_json())
+        item.save()
+        return item.serialize(), status.HTTP_200_OK, item_etag_header(item)
 
     #------------------------------------------------------------------
     # DELETE AN ITEM IN AN ORDER
     #------------------------------------------------------------------
     @api.doc('delete_item')
     @api.response(204, 'Item deleted')
+    @api.response(409, 'The item was changed by a concurrent request; retry it')
     def delete(self, order_id, item_id):
         """
         Delete an Item in an Order
         This endpoint will delete an Item based on the order_id and item_id specified in the path
         """
         app.logger.info("Request to delete an item in order %s with item_id: %s", order_id, item_id)
-        order = Order.find(order_id)
-
-        if order:
-            for item in order.order_items:
-                if item.id == item_id:
-                    item_found = True
-                    item.delete()
-                    order.save()
-                    app.logger.info("Item with ID [%s] in order %s is deleted.", item_id, order_id)
-                    break
+        item = OrderItem.find(order_id, item_id)
+        if item:
+            item.delete()
+            app.logger.info("Item with ID [%s] in order %s is deleted.", item_id, order_id)
 
         return '', status.HTTP_204_NO_CONTENT
 
@@ -415,8 +659,9 @@ class CancelOrderResource(Resource):
     # CANCEL AN ORDER
     #------------------------------------------------------------------
     @api.doc('cancel_orders')
+    @api.response(200, 'Success', order_model)
+    @api.response(409, 'The Order was changed by a concurrent request; retry it')
     @api.response(404, 'Order not found')
-    @api.marshal_with(order_model)
     def put(self, order_id):
         """
         Cancel an Order
@@ -428,7 +673,31 @@ class CancelOrderResource(Resource):
             abort(status.HTTP_404_NOT_FOUND, "Order was not found.")
         order.status = OrderStatus.Cancelled
         order.save()
-        return order.serialize(), status.HTTP_200_OK
+        result = order.serialize()
+        return result, status.HTTP_200_OK, etag_header(result)
+
+
+######################################################################
+# PATH: /customers/{cust_id}/summary
+######################################################################
+@api.route('/customers/<int:cust_id>/summary', strict_slashes=False)
+@api.param('cust_id', 'The Customer identifier')
+class CustomerSummaryResource(Resource):
+    """ Aggregates of the Orders of one customer """
+
+    #------------------------------------------------------------------
+    # SUMMARIZE THE ORDERS OF A CUSTOMER
+    #------------------------------------------------------------------
+    @api.doc('get_customer_summary')
+    @api.response(200, 'Success', customer_summary_model)
+    def get(self, cust_id):
+        """
+        Summarize the Orders of a customer
+        This endpoint will return the number of Orders by status, the total
+        spend and the last Order of a customer, computed in the database
+        """
+        app.logger.info("Request for the order summary of customer %s", cust_id)
+        return Order.customer_summary(cust_id), status.HTTP_200_OK
 
 
 ######################################################################
@@ -441,6 +710,71 @@ def abort(error_code: int, message: str):
     app.logger.error(message)
     api.abort(error_code, message)
 
+def replay_order_create(stored, request_hash):
+    """Returns the stored response of an Order create made with the same Idempotency-Key"""
+    if stored['request_hash'] != request_hash:
+        abort(status.HTTP_409_CONFLICT, "Idempotency-Key was already used with a different request")
+    app.logger.info("Replaying the creation of Order [%s]", stored['order_id'])
+    location_url = api.url_for(OrderResource, order_id=stored['order_id'], _external=True)
+    return stored['response'], status.HTTP_201_CREATED, {
+        'Location': location_url, 'Idempotent-Replayed': 'true'}
+
+def is_int(value):
+    """Returns True for JSON integers, which exclude booleans"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def next_page_link(args, limit, last_id):
+    """Builds the Link header that points at the page after last_id"""
+    next_url = api.url_for(
+        OrderCollection,
+        cust_id=args['cust_id'],
+        item_id=args['item_id'],
+        status=args['status'],
+        min_id=args['min_id'],
+        max_id=args['max_id'],
+        limit=limit,
+        after=last_id,
+        _external=True,
+    )
+    return '<{}>; rel="next"'.format(next_url)
+
+def order_etag(order_id, version):
+    """Returns the strong entity tag of a version of an Order"""
+    return "{}-{}".format(order_id, version)
+
+def etag_header(order):
+    """Returns the ETag header for a serialized Order"""
+    return {'ETag': quote_etag(order_etag(order['id'], order['version']))}
+
+def item_etag(item):
+    """Returns the strong entity tag of a version of an Order item"""
+    return "{}-{}-{}".format(item.order_id, item.id, item.version)
+
+def item_etag_header(item):
+    """Returns the ETag header for an Order item"""
+    return {'ETag': quote_etag(item_etag(item))}
+
+def check_if_match(etag):
+    """Aborts with 412 Precondition Failed if the request's If-Match does not match etag"""
+    if request.if_match and not any(request.if_match.contains(tag) for tag in etag_variants(etag)):
+        abort(status.HTTP_412_PRECONDITION_FAILED,
+              "If-Match does not match the current ETag: the resource was changed")
+
+def matching_etag(order_id, version):
+    """
+    Returns the ETag of the Order version if the request's If-None-Match matches it
+
+    The ETag of a compressed representation matches as well and is the one returned
+    """
+    return matching_variant(request.if_none_match, order_etag(order_id, version))
+
+def not_modified(etag):
+    """Returns a 304 Not Modified response that repeats the ETag"""
+    app.logger.info("Not modified: %s", etag)
+    response = make_response('', status.HTTP_304_NOT_MODIFIED)
+    response.set_etag(etag)
+    return response
+
 def check_content_type(media_type):
     """Checks that the media type is correct"""
     content_type = request.headers.get("Content-Type")
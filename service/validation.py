@@ -0,0 +1,218 @@
+"""
+Module: validation
+
+Payload validators compiled from the Swagger models of the API.
+
+compile_model() walks a flask-restx model once and returns a function that
+checks a whole payload in one pass, converts every field to its Python type
+and reports all field errors together in a single DataValidationError.
+Integer and Float fields also accept numeric strings, as sent by the UI
+forms. Fields the model does not define, or marks readonly, are ignored.
+
+The payload models of Orders and items are defined here, next to the
+validators that service.models compiles from them, and registered with the
+API by service.routes.
+"""
+import math
+from flask_restx import Model, fields
+
+
+class DataValidationError(Exception):
+    """ Used for an data validation errors when deserializing """
+
+
+class FieldError(Exception):
+    """ Raised by a field check with the reason the value is not valid """
+
+
+def check_int(value):
+    """Returns value as an int"""
+    if type(value) is int:  # pylint: disable=unidiomatic-typecheck
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise FieldError("must be int")
+
+
+def check_float(value):
+    """Returns value as a finite float"""
+    if type(value) is float or type(value) is int:  # pylint: disable=unidiomatic-typecheck
+        result = float(value)
+    elif isinstance(value, str):
+        try:
+            result = float(value)
+        except ValueError:
+            raise FieldError("must be float") from None
+    else:
+        raise FieldError("must be float")
+    if not math.isfinite(result):
+        raise FieldError("must be float")
+    return result
+
+
+def check_string(field):
+    """Returns the check of a String field, which also applies its enum"""
+    enum = frozenset(field.enum) if getattr(field, "enum", None) else None
+
+    def check(value):
+        if not isinstance(value, str):
+            raise FieldError("must be string")
+        if not value:
+            raise FieldError("must not be empty")
+        if enum is not None and value not in enum:
+            raise FieldError("must be one of " + ", ".join(field.enum))
+        return value
+
+    return check
+
+
+def prefix_errors(errors, start, parent):
+    """Prefixes the paths of the errors from index start on with their parent field or index"""
+    for index in range(start, len(errors)):
+        path, message = errors[index]
+        if path and not path.startswith("["):
+            path = "." + path
+        errors[index] = (parent + path, message)
+
+
+def check_list(item_check):
+    """Returns the check of a List field whose entries are checked by item_check"""
+    collects_errors = getattr(item_check, "collects_errors", False)
+
+    def check(value, errors):
+        if not isinstance(value, list):
+            errors.append(("", "must be a list"))
+            return None
+        result = []
+        for index, entry in enumerate(value):
+            if collects_errors:
+                start = len(errors)
+                result.append(item_check(entry, errors))
+                if len(errors) > start:
+                    prefix_errors(errors, start, "[{}]".format(index))
+                continue
+            try:
+                result.append(item_check(entry))
+            except FieldError as error:
+                errors.append(("[{}]".format(index), str(error)))
+        return result
+
+    check.collects_errors = True
+    return check
+
+
+def compile_field(field, types):
+    """Returns the check of one flask-restx field"""
+    if isinstance(field, fields.Integer):
+        return check_int
+    if isinstance(field, fields.Float):
+        return check_float
+    if isinstance(field, fields.String):
+        return check_string(field)
+    if isinstance(field, fields.List):
+        return check_list(compile_field(field.container, types))
+    if isinstance(field, fields.Nested):
+        return compile_object(field.model, types)
+    raise TypeError("Cannot compile a validator for {}".format(type(field).__name__))
+
+
+def compile_object(model, types, optional=()):
+    """
+    Returns the check of a model's object
+
+    The check appends (path, message) pairs for its field errors to errors
+    and returns the converted object. Error paths are only built for the fields that failed, so valid
+    payloads pay for no string formatting.
+    """
+    build = types.get(model.name, dict)
+    store = dict.__setitem__ if build is dict else setattr
+    checks = []
+    for name, field in model.resolved.items():
+        if field.readonly:
+            continue
+        field_check = compile_field(field, types)
+        required = field.required and name not in optional
+        checks.append((name, required, field_check, getattr(field_check, "collects_errors", False)))
+    checks = tuple(checks)
+
+    def check(value, errors):
+        if not isinstance(value, dict):
+            errors.append(("", "must be an object"))
+            return None
+        result = build()
+        for name, required, field_check, collects_errors in checks:
+            field_value = value.get(name)
+            if field_value is None:
+                if required:
+                    errors.append((name, "is required"))
+                continue
+            if collects_errors:
+                start = len(errors)
+                store(result, name, field_check(field_value, errors))
+                if len(errors) > start:
+                    prefix_errors(errors, start, name)
+                continue
+            try:
+                store(result, name, field_check(field_value))
+            except FieldError as error:
+                errors.append((name, str(error)))
+        return result
+
+    check.collects_errors = True
+    return check
+
+
+def compile_model(model, types=None, optional=()):
+    """
+    Compiles a validator for payloads of a flask-restx model
+
+    The validator returns the payload converted to Python types, or raises
+    a DataValidationError that lists every field error of the payload
+
+    Args:
+        model (Model): the model of the payloads
+        types (dict): classes by model name; the objects of those models
+            are built as instances of the class, with their fields set as
+            attributes, in the same pass instead of as dicts
+        optional (tuple): fields of the model that payloads may leave out,
+            although the documented model requires them
+    """
+    check = compile_object(model, types or {}, frozenset(optional))
+    prefix = "Invalid {}: ".format(model.name)
+
+    def validate(data):
+        errors = []
+        result = check(data, errors)
+        if errors:
+            raise DataValidationError(prefix + "; ".join(
+                "{} {}".format(path, message) if path else message for path, message in errors
+            ))
+        return result
+
+    return validate
+
+
+# Define the OrderItem model so that the docs reflect what can be sent
+create_item_model = Model('OrderItem', {
+    'item_id': fields.Integer(required=True,
+                              description='The product ID that identifies the item'),
+    'item_name': fields.String(required=True,
+                               description='The name of the item'),
+    'item_qty': fields.Integer(required=True,
+                                description='Quantity for the item'),
+    'item_price': fields.Float(required=True,
+                              description='Price of the item'),
+})
+
+# Define the order model so that the docs reflect what can be sent
+create_order_model = Model('Order', {
+    'cust_id': fields.Integer(required=True,
+                          description='Customer ID for the customer who placed the order'),
+    'status': fields.String(required=True,
+                              description='Status of the order', enum = ['Received', 'Processing', 'Cancelled']),
+    'order_items': fields.List(fields.Nested(create_item_model, required=True), required=True,
+                               description='Items in the Order')
+})
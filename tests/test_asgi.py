@@ -0,0 +1,173 @@
+"""
+Test cases for the async serving mode
+
+The async endpoints themselves need PostgreSQL, so these cases cover the
+query building, the serialization and the hand-over to the Flask routes.
+"""
+import logging
+import unittest
+import config
+from service import status
+from service.metrics import registry
+from service.models import Order, db, init_db
+from service.routes import app
+from .factories import OrderFactory
+
+try:
+    from starlette.testclient import TestClient
+    from service import asgi
+except ImportError:  # the async extras are not installed
+    asgi = None
+
+DATABASE_URI = config.DATABASE_URI
+
+
+class FakeConnection:
+    """ An asyncpg connection stand-in that finds no rows, or the given order row """
+    def __init__(self, row=None):
+        self.row = row
+
+    async def fetch(self, sql, *params):
+        return []
+
+    async def fetchrow(self, sql, *params):
+        return self.row
+
+
+class FakePool:
+    """ An asyncpg pool stand-in that hands out FakeConnections """
+    def __init__(self, row=None):
+        self.row = row
+
+    def acquire(self):
+        return self
+
+    async def __aenter__(self):
+        return FakeConnection(self.row)
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+######################################################################
+#  A S G I   T E S T   C A S E S
+######################################################################
+@unittest.skipIf(asgi is None, "requirements-async.txt is not installed")
+class TestAsgi(unittest.TestCase):
+    """ Async serving mode tests """
+
+    @classmethod
+    def setUpClass(cls):
+        """Run once before all tests"""
+        app.config["TESTING"] = True
+        app.config["DEBUG"] = False
+        app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
+        app.logger.setLevel(logging.CRITICAL)
+        init_db(app)
+
+    def setUp(self):
+        """Runs before each test"""
+        db.drop_all()
+        db.create_all()
+        Order.cache.clear()
+        # no lifespan, so only the requests handed to Flask can be served
+        self.client = TestClient(asgi.create_app(app))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_list_query(self):
+        """ Build the SQL of the order list like the Flask route filters """
+        sql, params = asgi.list_query({}, 11)
+        self.assertEqual(sql, 'SELECT id, cust_id, status, version, item_count, total_amount '
+                              'FROM "order" ORDER BY id LIMIT $1')
+        self.assertEqual(params, [11])
+        sql, params = asgi.list_query({"cust_id": 7, "item_id": 3, "after": 20}, 5)
+        self.assertIn("WHERE cust_id = $1 AND id IN (SELECT order_id FROM order_item WHERE item_id = $2) "
+                      "AND id > $3 ORDER BY id LIMIT $4", sql)
+        self.assertEqual(params, [7, 3, 20, 5])
+        sql, params = asgi.list_query({"status": "Received", "min_id": 2, "max_id": 9}, 5)
+        self.assertIn("WHERE status = $1 AND id >= $2 AND id <= $3", sql)
+        self.assertEqual(params, ["Received", 2, 9, 5])
+        sql, params = asgi.list_query({"item_id": 3}, 5)
+        self.assertIn("id IN (SELECT order_id FROM order_item WHERE item_id = $1)", sql)
+        self.assertEqual(params, [3, 5])
+
+    def test_serialize_order(self):
+        """ Serialize rows like Order.serialize() """
+        order = OrderFactory()
+        order.create()
+        expected = Order.find(order.id).serialize()
+        row = {name: expected[name] for name in asgi.ORDER_COLUMNS.split(", ")}
+        self.assertEqual(asgi.serialize_order(row, expected["order_items"]), expected)
+
+    def test_not_modified(self):
+        """ Match If-None-Match like the Flask routes, compressed and weak tags included """
+        row = {"id": 1, "cust_id": 7, "status": "Received", "version": 2, "item_count": 0,
+               "total_amount": 0.0}
+        self.client.app.state.pool = FakePool(row)
+        resp = self.client.get("/api/orders/1")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.headers["ETag"], '"1-2"')
+        for header, etag in (('"1-2"', '"1-2"'), ('"1-1", "1-2-gzip"', '"1-2-gzip"'),
+                             ('W/"1-2-gzip"', '"1-2-gzip"'), ("*", '"1-2"')):
+            for url in ("/api/orders/1", "/api/orders/1/items"):
+                resp = self.client.get(url, headers={"If-None-Match": header})
+                self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED, header)
+                self.assertEqual(resp.headers["ETag"], etag)
+                self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        resp = self.client.get("/api/orders/1/items", headers={"If-None-Match": '"1-1"'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json(), [])
+
+    def test_native_requests_recorded(self):
+        """ Count the native requests and their statements on /metrics like the Flask ones """
+        registry.reset()
+        app.config["SQL_PROFILING_HEADERS"] = True
+        try:
+            self.client.app.state.pool = FakePool()
+            resp = self.client.get("/api/orders")
+        finally:
+            app.config["SQL_PROFILING_HEADERS"] = False
+        self.assertEqual(resp.headers["X-DB-Query-Count"], "2")
+        self.assertIn("Server-Timing", resp.headers)
+        self.assertEqual(registry.requests[("OrderCollection", "GET", "200")], 1)
+        self.assertEqual(registry.db_queries[("OrderCollection", "GET")], 2)
+        # requests handed to Flask are recorded once, by Flask
+        self.client.get("/api/orders/1")
+        self.assertEqual(registry.requests[("OrderResource", "GET", "404")], 1)
+
+    def test_writes_served_by_flask(self):
+        """ Writes are handed to the Flask routes """
+        resp = self.client.post("/api/orders", json=OrderFactory().serialize())
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        order_id = resp.json()["id"]
+        resp = self.client.put("/api/orders/{}/cancel".format(order_id))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()["status"], "Cancelled")
+
+    def test_not_found_served_by_flask(self):
+        """ Missing orders and items get the Flask error responses """
+        self.client.app.state.pool = FakePool()
+        resp = self.client.get("/api/orders/1")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn("message", resp.json())
+        resp = self.client.get("/api/orders/1/items/1")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_orders(self):
+        """ List orders and hand invalid queries to Flask """
+        self.client.app.state.pool = FakePool()
+        resp = self.client.get("/api/orders", params={"cust_id": 1, "limit": 5})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json(), [])
+        resp = self.client.get("/api/orders", params={"limit": 0})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get("/api/orders", params={"cust_id": "abc"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get("/api/orders", params={"cust_id": 1, "status": "Cancelled", "min_id": 3})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        for params in ({"status": "Lost"}, {"min_id": -1}):
+            resp = self.client.get("/api/orders", params=params)
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST, params)
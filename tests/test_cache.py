@@ -0,0 +1,73 @@
+"""
+Test cases for the order cache
+
+"""
+import unittest
+from service.cache import LRUCache
+
+
+class FakeTimer:
+    """ A clock that only moves when told to """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+######################################################################
+#  L R U   C A C H E   T E S T   C A S E S
+######################################################################
+class TestLRUCache(unittest.TestCase):
+    """ Test Cases for LRUCache """
+
+    def setUp(self):
+        """ This runs before each test """
+        self.timer = FakeTimer()
+        self.cache = LRUCache(maxsize=2, ttl=10, timer=self.timer)
+
+    def test_get_and_set(self):
+        """ Cache a value and count hits and misses """
+        self.assertIsNone(self.cache.get(1))
+        self.cache.set(1, {"id": 1})
+        self.assertEqual(self.cache.get(1), {"id": 1})
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_evict_least_recently_used(self):
+        """ Evict the least recently used entry when full """
+        self.cache.set(1, "one")
+        self.cache.set(2, "two")
+        self.cache.get(1)
+        self.cache.set(3, "three")
+        self.assertIsNone(self.cache.get(2))
+        self.assertEqual(self.cache.get(1), "one")
+        self.assertEqual(self.cache.get(3), "three")
+
+    def test_expire_entries(self):
+        """ Entries expire after the ttl """
+        self.cache.set(1, "one")
+        self.timer.now = 9.9
+        self.assertEqual(self.cache.get(1), "one")
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_delete_and_clear(self):
+        """ Delete one entry or all of them """
+        self.cache.set(1, "one")
+        self.cache.set(2, "two")
+        self.cache.delete(1)
+        self.cache.delete(404)
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.get(2), "two")
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(2))
+
+    def test_disabled(self):
+        """ A cache with no room stores nothing """
+        cache = LRUCache(maxsize=0)
+        cache.set(1, "one")
+        self.assertIsNone(cache.get(1))
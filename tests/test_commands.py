@@ -0,0 +1,107 @@
+"""
+Test cases for the flask CLI commands
+
+"""
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import inspect
+import config
+from service.models import IdempotencyKey, db, init_db
+from service import app
+
+DATABASE_URI = config.DATABASE_URI
+
+
+######################################################################
+#  C O M M A N D   T E S T   C A S E S
+######################################################################
+class TestCommands(unittest.TestCase):
+    """ Test Cases for the maintenance commands """
+
+    @classmethod
+    def setUpClass(cls):
+        """Run once before all tests"""
+        app.config["TESTING"] = True
+        app.config["DEBUG"] = False
+        app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
+        app.logger.setLevel(logging.CRITICAL)
+        init_db(app)
+
+    def setUp(self):
+        """Runs before each test"""
+        db.drop_all()
+        db.create_all()
+        IdempotencyKey.cache.clear()
+        self.runner = app.test_cli_runner()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def _add_keys(self, count, age):
+        """Stores count keys created age seconds ago"""
+        created_at = datetime.utcnow() - timedelta(seconds=age)
+        for _ in range(count):
+            number = IdempotencyKey.query.count()
+            db.session.add(IdempotencyKey(key="key-{}".format(number), request_hash="0" * 64,
+                                          order_id=number, response={}, created_at=created_at))
+            db.session.commit()
+
+    def test_purge_idempotency_keys(self):
+        """ Purge the expired idempotency keys in batches """
+        self._add_keys(5, IdempotencyKey.ttl + 60)
+        self._add_keys(2, 60)
+        self.assertIsNone(IdempotencyKey.find("key-0"))
+        self.assertIsNotNone(IdempotencyKey.find("key-6"))
+        result = self.runner.invoke(args=["purge-idempotency-keys", "--batch-size", "2"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Purged 5 expired idempotency keys", result.output)
+        self.assertEqual(sorted(key.key for key in IdempotencyKey.query.all()), ["key-5", "key-6"])
+        result = self.runner.invoke(args=["purge-idempotency-keys"])
+        self.assertIn("Purged 0 expired idempotency keys", result.output)
+
+    def test_db_create(self):
+        """ Create the tables and indexes with the db-create command """
+        db.drop_all()
+        self.assertEqual(inspect(db.engine).get_table_names(), [])
+        for _ in range(2):
+            result = self.runner.invoke(args=["db-create"])
+            self.assertEqual(result.exit_code, 0, result.output)
+        inspector = inspect(db.engine)
+        self.assertEqual(sorted(inspector.get_table_names()), ["idempotency_key", "order", "order_item"])
+        indexes = {index["name"] for index in inspector.get_indexes("order_item")}
+        self.assertIn("ix_order_item_item_id_order_id", indexes)
+
+    def test_db_create_adds_columns(self):
+        """ Add the columns declared after the tables were created, with the order totals """
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.execute('CREATE TABLE "order" (id INTEGER PRIMARY KEY, cust_id INTEGER, '
+                               'status VARCHAR(10) NOT NULL)')
+            connection.execute('CREATE TABLE order_item (id INTEGER PRIMARY KEY, '
+                               'order_id INTEGER REFERENCES "order" (id), item_id INTEGER, '
+                               'item_name VARCHAR(100) NOT NULL, item_qty INTEGER, item_price FLOAT)')
+            connection.execute("INSERT INTO \"order\" VALUES (1, 7, 'Received'), (2, 8, 'Received')")
+            connection.execute("INSERT INTO order_item VALUES (1, 1, 10, 'ipad', 2, 2.5), (2, 1, 11, 'case', 1, 5.0)")
+        for _ in range(2):
+            result = self.runner.invoke(args=["db-create"])
+            self.assertEqual(result.exit_code, 0, result.output)
+        orders = db.engine.execute('SELECT id, version, item_count, total_amount FROM "order" ORDER BY id')
+        self.assertEqual([tuple(row) for row in orders], [(1, 1, 2, 10.0), (2, 1, 0, 0.0)])
+        items = db.engine.execute("SELECT id, version FROM order_item ORDER BY id")
+        self.assertEqual([tuple(row) for row in items], [(1, 1), (2, 1)])
+
+    def test_import_does_not_touch_database(self):
+        """ Import the service without connecting to the database """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "orders.db")
+            env = dict(os.environ, DATABASE_URI="sqlite:///" + path)
+            subprocess.run([sys.executable, "-c", "import service"], env=env, check=True,
+                           cwd=os.path.join(os.path.dirname(__file__), os.pardir))
+            # SQLite creates the file on the first connection
+            self.assertFalse(os.path.exists(path))
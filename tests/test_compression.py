@@ -0,0 +1,130 @@
+"""
+Test cases for the response compression
+
+"""
+import gzip
+import json
+import logging
+import unittest
+import config
+from service import status
+from werkzeug.http import parse_etags
+from service.compression import brotli, etag_variants, matching_variant
+from service.models import Order, db, init_db
+from service.routes import app
+from .factories import OrderFactory, OrderItemFactory
+
+DATABASE_URI = config.DATABASE_URI
+BASE_API = "/api/orders"
+
+
+######################################################################
+#  C O M P R E S S I O N   T E S T   C A S E S
+######################################################################
+class TestCompression(unittest.TestCase):
+    """ Test Cases for the compression of responses """
+
+    @classmethod
+    def setUpClass(cls):
+        """Run once before all tests"""
+        app.config["TESTING"] = True
+        app.config["DEBUG"] = False
+        app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
+        app.logger.setLevel(logging.CRITICAL)
+        init_db(app)
+
+    def setUp(self):
+        """Runs before each test"""
+        db.drop_all()
+        db.create_all()
+        Order.cache.clear()
+        self.app = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def _create_orders(self, count, items=5):
+        """Creates orders with items and returns their ids"""
+        return Order.create_many([
+            OrderFactory(order_items=[OrderItemFactory() for _ in range(items)]) for _ in range(count)
+        ])
+
+    def test_list_gzip(self):
+        """ Compress a large order list for clients that accept gzip """
+        self._create_orders(20)
+        plain = self.app.get(BASE_API)
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.headers["Vary"])
+
+        resp = self.app.get(BASE_API, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        self.assertEqual(int(resp.headers["Content-Length"]), len(resp.data))
+        self.assertLess(len(resp.data), len(plain.data) / 3)
+        self.assertEqual(json.loads(gzip.decompress(resp.data)), plain.get_json())
+
+    def test_small_and_refused(self):
+        """ Leave small responses and refused encodings alone """
+        resp = self.app.get(BASE_API, headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+        self._create_orders(20)
+        for accept in ("identity", "gzip;q=0", "compress"):
+            resp = self.app.get(BASE_API, headers={"Accept-Encoding": accept})
+            self.assertNotIn("Content-Encoding", resp.headers, accept)
+        resp = self.app.get("/", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+    def test_export_streamed(self):
+        """ Compress the streamed export as it is sent """
+        self._create_orders(30)
+        plain = self.app.get(BASE_API + "/export").get_data()
+        resp = self.app.get(BASE_API + "/export", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", resp.headers)
+        self.assertEqual(gzip.decompress(resp.get_data()), plain)
+
+    def test_etag_of_compressed_order(self):
+        """ Give a compressed order its own ETag and honour it in conditional requests """
+        order_id = self._create_orders(1, items=40)[0]
+        url = "{}/{}".format(BASE_API, order_id)
+        plain_etag = self.app.get(url).headers["ETag"]
+        resp = self.app.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        etag = resp.headers["ETag"]
+        self.assertEqual(etag, plain_etag[:-1] + '-gzip"')
+        resp = self.app.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(resp.headers["ETag"], etag)
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        # a proxy that compresses may weaken the tag
+        resp = self.app.get(url, headers={"If-None-Match": "W/" + etag})
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        resp = self.app.put(url, json={"cust_id": 7}, content_type="application/json",
+                            headers={"If-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_etag_variants(self):
+        """ List the ETags of the representations of a version """
+        variants = etag_variants("5-2")
+        self.assertEqual(variants[0], "5-2")
+        self.assertIn("5-2-gzip", variants)
+
+    def test_matching_variant(self):
+        """ Match If-None-Match against every representation, weakly """
+        self.assertEqual(matching_variant(parse_etags('"5-2"'), "5-2"), "5-2")
+        self.assertEqual(matching_variant(parse_etags('"5-1", "5-2-gzip"'), "5-2"), "5-2-gzip")
+        self.assertEqual(matching_variant(parse_etags('W/"5-2-gzip"'), "5-2"), "5-2-gzip")
+        self.assertEqual(matching_variant(parse_etags("*"), "5-2"), "5-2")
+        self.assertIsNone(matching_variant(parse_etags('"5-1"'), "5-2"))
+        self.assertIsNone(matching_variant(parse_etags(None), "5-2"))
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_list_brotli(self):
+        """ Prefer brotli when the client accepts it """
+        self._create_orders(20)
+        plain = self.app.get(BASE_API)
+        resp = self.app.get(BASE_API, headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual(resp.headers["Content-Encoding"], "br")
+        self.assertEqual(json.loads(brotli.decompress(resp.data)), plain.get_json())
@@ -0,0 +1,61 @@
+"""
+Test cases for the gunicorn settings
+
+"""
+import os
+import runpy
+import unittest
+from unittest import mock
+
+CONFIG = os.path.join(os.path.dirname(__file__), os.pardir, "gunicorn.conf.py")
+
+
+def load_settings(**env):
+    """Returns the settings of gunicorn.conf.py read with env"""
+    with mock.patch.dict(os.environ, env):
+        return runpy.run_path(CONFIG)
+
+
+######################################################################
+#  G U N I C O R N   S E T T I N G S   T E S T   C A S E S
+######################################################################
+class TestGunicornConf(unittest.TestCase):
+    """ Test Cases for gunicorn.conf.py """
+
+    def test_defaults(self):
+        """ Use preloaded threaded workers sized from the CPUs """
+        with mock.patch.dict(os.environ):
+            for name in ("WEB_CONCURRENCY", "GUNICORN_WORKER_CLASS", "GUNICORN_MAX_REQUESTS", "PORT",
+                         "MEMORY_LIMIT", "GUNICORN_WORKER_MEMORY_MB"):
+                os.environ.pop(name, None)
+            settings = runpy.run_path(CONFIG)
+        cpus = settings["cpu_count"]()
+        self.assertEqual(settings["workers"], min(cpus * 2 + 1, 4))
+        self.assertEqual(settings["worker_class"], "gthread")
+        self.assertTrue(settings["preload_app"])
+        self.assertEqual(settings["max_requests"], 1000)
+        self.assertEqual(settings["max_requests_jitter"], 100)
+        self.assertEqual(settings["bind"], "0.0.0.0:8080")
+
+    def test_memory_limit(self):
+        """ Run no more workers than the memory limit of the instance holds """
+        with mock.patch.object(os, "cpu_count", return_value=8), \
+                mock.patch.object(os, "sched_getaffinity", create=True, return_value=set(range(8))):
+            self.assertEqual(load_settings(MEMORY_LIMIT="128m")["workers"], 2)
+            self.assertEqual(load_settings(MEMORY_LIMIT="1G")["workers"], 4)
+            self.assertEqual(load_settings(MEMORY_LIMIT="64M", GUNICORN_WORKER_MEMORY_MB="32")["workers"], 2)
+            self.assertEqual(load_settings(MEMORY_LIMIT="32m")["workers"], 1)
+            self.assertEqual(load_settings(MEMORY_LIMIT="128m", WEB_CONCURRENCY="3")["workers"], 3)
+
+    def test_environment(self):
+        """ Read every setting from the environment """
+        settings = load_settings(PORT="5000", WEB_CONCURRENCY="6", GUNICORN_WORKER_CLASS="sync",
+                                 GUNICORN_THREADS="8", GUNICORN_PRELOAD="false",
+                                 GUNICORN_MAX_REQUESTS="0")
+        self.assertEqual(settings["bind"], "0.0.0.0:5000")
+        self.assertEqual(settings["workers"], 6)
+        self.assertEqual(settings["worker_class"], "sync")
+        self.assertEqual(settings["threads"], 8)
+        self.assertFalse(settings["preload_app"])
+        self.assertEqual(settings["max_requests"], 0)
+        self.assertEqual(settings["max_requests_jitter"], 0)
@@ -0,0 +1,107 @@
+"""
+Test cases for the queued logging
+
+"""
+import logging
+import queue
+import unittest
+from flask import Flask, g
+from service.logs import DroppingQueueHandler, LogQueue, RequestSampler, init_app
+
+
+class ListHandler(logging.Handler):
+    """Keeps the messages it handles"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+######################################################################
+#  L O G G I N G   T E S T   C A S E S
+######################################################################
+class TestLogs(unittest.TestCase):
+    """ Test Cases for the logging queue """
+
+    def setUp(self):
+        self.target = ListHandler()
+        self.target.setFormatter(logging.Formatter("%(levelname)s %(module)s %(message)s"))
+
+    def test_drop_when_full(self):
+        """ Drop and count the records that do not fit in the queue """
+        handler = DroppingQueueHandler(queue.Queue(2))
+        logger = logging.getLogger("test_logs.drop")
+        logger.propagate = False
+        logger.addHandler(handler)
+        for number in range(5):
+            logger.warning("line %d", number)
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_sampler(self):
+        """ Keep the info records of sampled requests and every warning """
+        sampler = RequestSampler()
+        info = logging.LogRecord("test", logging.INFO, __file__, 1, "info", None, None)
+        warning = logging.LogRecord("test", logging.WARNING, __file__, 1, "warning", None, None)
+        self.assertTrue(sampler.filter(info))
+        app = Flask("test_logs")
+        with app.test_request_context("/"):
+            self.assertTrue(sampler.filter(info))
+            g.log_sampled = False
+            self.assertFalse(sampler.filter(info))
+            self.assertTrue(sampler.filter(warning))
+
+    def test_writer_thread(self):
+        """ Write the queued records with the original handlers """
+        log_queue = LogQueue([self.target], 100, 1.0)
+        log_queue.start()
+        logger = logging.getLogger("test_logs.writer")
+        logger.propagate = False
+        logger.addHandler(log_queue.handler)
+        logger.warning("order %s", 7)
+        log_queue.listener.stop()  # a forked child has lost the writer thread
+        log_queue.restart_in_child()
+        logger.warning("after fork")
+        log_queue.stop()
+        self.assertEqual(self.target.messages, ["WARNING test_logs order 7", "WARNING test_logs after fork"])
+
+    def test_stop_with_full_queue(self):
+        """ Write out every queued record when stopping with a full queue """
+        log_queue = LogQueue([self.target], 5, 1.0)
+        logger = logging.getLogger("test_logs.full")
+        logger.propagate = False
+        logger.addHandler(log_queue.handler)
+        for number in range(5):
+            logger.warning("line %d", number)
+        log_queue.start()
+        log_queue.stop()
+        self.assertEqual(len(self.target.messages), 5)
+
+    def test_init_app(self):
+        """ Put the app logger behind the queue and sample request logs """
+        app = Flask("test_logs")
+        app.config.update(LOG_QUEUE_SIZE=100, LOG_SAMPLE_RATE=0.0)
+        handlers, level = app.logger.handlers, app.logger.level
+        app.logger.handlers = [self.target]
+        app.logger.setLevel(logging.INFO)
+
+        @app.route("/")
+        def index():  # pylint: disable=unused-variable
+            app.logger.info("request info")
+            app.logger.warning("request warning")
+            return ""
+
+        try:
+            init_app(app)
+            init_app(app)
+            self.assertEqual(len(app.logger.handlers), 1)
+            self.assertIsInstance(app.logger.handlers[0], DroppingQueueHandler)
+            app.logger.info("startup")
+            app.test_client().get("/")
+            app.extensions["log_queue"].stop()
+        finally:
+            app.logger.handlers, app.logger.level = handlers, level
+        self.assertEqual(self.target.messages, ["INFO test_logs startup", "WARNING test_logs request warning"])
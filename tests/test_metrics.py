@@ -0,0 +1,89 @@
+"""
+Test cases for the Prometheus metrics
+
+"""
+import logging
+import unittest
+import config
+from service import status
+from service.metrics import Registry, registry
+from service.models import Order, db, init_db
+from service.routes import app
+from .factories import OrderFactory
+
+DATABASE_URI = config.DATABASE_URI
+
+
+######################################################################
+#  R E G I S T R Y   T E S T   C A S E S
+######################################################################
+class TestRegistry(unittest.TestCase):
+    """ Test Cases for the metrics Registry """
+
+    def test_observe_and_render(self):
+        """ Render counters and a cumulative latency histogram """
+        metrics = Registry(buckets=(0.1, 1.0))
+        metrics.observe("OrderResource", "GET", 200, 0.05, queries=2, db_seconds=0.01)
+        metrics.observe("OrderResource", "GET", 404, 0.5, queries=1, db_seconds=0.02)
+        metrics.observe("OrderResource", "GET", 200, 5.0)
+        lines = metrics.render()
+        labels = 'handler="OrderResource",method="GET"'
+        self.assertIn('orders_http_requests_total{%s,status="200"} 2' % labels, lines)
+        self.assertIn('orders_http_requests_total{%s,status="404"} 1' % labels, lines)
+        self.assertIn('orders_http_request_duration_seconds_bucket{%s,le="0.1"} 1' % labels, lines)
+        self.assertIn('orders_http_request_duration_seconds_bucket{%s,le="1.0"} 2' % labels, lines)
+        self.assertIn('orders_http_request_duration_seconds_bucket{%s,le="+Inf"} 3' % labels, lines)
+        self.assertIn('orders_http_request_duration_seconds_count{%s} 3' % labels, lines)
+        self.assertIn('orders_db_queries_total{%s} 3' % labels, lines)
+        metrics.reset()
+        self.assertNotIn('orders_db_queries_total{%s} 3' % labels, metrics.render())
+
+
+######################################################################
+#  M E T R I C S   E N D P O I N T   T E S T   C A S E S
+######################################################################
+class TestMetricsEndpoint(unittest.TestCase):
+    """ Test Cases for GET /metrics """
+
+    @classmethod
+    def setUpClass(cls):
+        """Run once before all tests"""
+        app.config["TESTING"] = True
+        app.config["DEBUG"] = False
+        app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
+        app.logger.setLevel(logging.CRITICAL)
+        init_db(app)
+
+    def setUp(self):
+        """Runs before each test"""
+        db.drop_all()
+        db.create_all()
+        Order.cache.clear()
+        registry.reset()
+        self.app = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_metrics(self):
+        """ Report requests, latency and SQL statements per handler """
+        order = OrderFactory()
+        resp = self.app.post("/api/orders", json=order.serialize(), content_type="application/json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.app.get("/api/orders/{}".format(resp.get_json()["id"]))
+        self.app.get("/api/orders/0")
+
+        resp = self.app.get("/metrics")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.content_type.startswith("text/plain; version=0.0.4"))
+        body = resp.get_data(as_text=True)
+        self.assertIn('orders_http_requests_total{handler="OrderCollection",method="POST",status="201"} 1', body)
+        self.assertIn('orders_http_requests_total{handler="OrderResource",method="GET",status="200"} 1', body)
+        self.assertIn('orders_http_requests_total{handler="OrderResource",method="GET",status="404"} 1', body)
+        self.assertIn('orders_http_request_duration_seconds_count{handler="OrderResource",method="GET"} 2', body)
+        self.assertIn("orders_cache_misses_total", body)
+        queries = [line for line in body.splitlines()
+                   if line.startswith('orders_db_queries_total{handler="OrderCollection",method="POST"}')]
+        self.assertEqual(len(queries), 1)
+        self.assertGreater(int(queries[0].split()[-1]), 0)
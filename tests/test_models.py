@@ -6,7 +6,9 @@ import logging
 import unittest
 import os
 import config
-from service.models import Order, OrderItem, DataValidationError, db
+from sqlalchemy import event
+from sqlalchemy.orm.exc import StaleDataError
+from service.models import Order, OrderItem, OrderStatus, DataValidationError, db, create_indexes
 from service import app
 
 DATABASE_URI = config.DATABASE_URI
@@ -28,12 +30,13 @@ class TestOrder(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         """ This runs once after the entire test suite """
-        db.session.close()
+        db.session.remove()
 
     def setUp(self):
         """ This runs before each test """
         db.drop_all()  # clean up the last tests
         db.create_all()  # make our sqlalchemy tables
+        Order.cache.clear()
         self.order = Order(cust_id = 999, order_items = [OrderItem(order_id = 1, item_id = 2000, \
             item_name = "IPHONE 13 PRO", \
             item_qty = 1, item_price = 1500)])
@@ -217,3 +220,258 @@ class TestOrder(unittest.TestCase):
         self.assertEqual(Order.find_by_customer(query_customer_id)[1].cust_id, query_customer_id)
 
         self.assertEqual(Order.find_by_customer(999).count(), 0)
+
+    def test_find_by_filters(self):
+        """ Find the Orders matching all of several filters """
+        for cust_id, item_id in ((1000, 678), (1000, 543), (1001, 678), (1000, 678)):
+            Order(cust_id = cust_id, order_items = [OrderItem(item_id = item_id, \
+                item_name = "IPHONE 13 PRO", item_qty = 1, item_price = 1500)]).create()
+        ids = [order.id for order in Order.all()]
+        Order.cancel_many(order_ids=[ids[3]])
+
+        def found(**filters):
+            return [order.id for order in Order.find_by_filters(**filters).order_by(Order.id)]
+
+        self.assertEqual(found(), ids)
+        self.assertEqual(found(customer_id=1000, item_id=678), [ids[0], ids[3]])
+        self.assertEqual(found(customer_id=1000, item_id=678, order_status=OrderStatus.Received), [ids[0]])
+        self.assertEqual(found(item_id=678, min_id=ids[1], max_id=ids[2]), [ids[2]])
+        self.assertEqual(found(customer_id=1001, order_status=OrderStatus.Cancelled), [])
+        plan = self._query_plan(Order.find_by_filters(customer_id=1000, item_id=678))
+        self.assertIn("ix_order_cust_id", plan)
+        self.assertIn("ix_order_item_item_id_order_id", plan)
+
+    def test_cancel_many(self):
+        """ Cancel the Orders matching a filter with one UPDATE """
+        for cust_id, item_id in ((1000, 1), (1000, 2), (1001, 1), (1000, 1)):
+            Order(cust_id = cust_id, order_items = [OrderItem(item_id = item_id, \
+                item_name = "ipad", item_qty = 1, item_price = 888)]).create()
+        order_ids = [order.id for order in Order.all()]
+        Order.find_serialized(order_ids[0])
+
+        statements = []
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", count_statement)
+        try:
+            count = Order.cancel_many(customer_id = 1000, item_id = 1)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_statement)
+        self.assertEqual(count, 2)
+        self.assertEqual(len([s for s in statements if s.startswith("UPDATE")]), 1)
+        self.assertFalse([s for s in statements if s.startswith("SELECT")])
+        self.assertEqual(Order.cache.stats()["size"], 0)
+
+        db.session.expire_all()
+        cancelled = [order.id for order in Order.all() if order.status == OrderStatus.Cancelled]
+        self.assertEqual(cancelled, [order_ids[0], order_ids[3]])
+        self.assertEqual(Order.find_version(order_ids[0]), 2)
+        self.assertEqual(Order.find_version(order_ids[1]), 1)
+
+        # already cancelled Orders are not counted again
+        self.assertEqual(Order.cancel_many(order_ids = order_ids), 2)
+        self.assertEqual(Order.find_version(order_ids[0]), 2)
+        self.assertEqual(Order.cancel_many(order_ids = []), 0)
+
+    def test_customer_summary(self):
+        """ Summarize the Orders of a customer in one query """
+        for qty, cust_id in ((1, 1000), (2, 1000), (3, 1001), (4, 1000)):
+            Order(cust_id = cust_id, order_items = [OrderItem(item_id = 678, \
+                item_name = "IPHONE 13 PRO", item_qty = qty, item_price = 100)]).create()
+        cancelled = Order.find_by_customer(1000).order_by(Order.id).first()
+        cancelled.status = OrderStatus.Cancelled
+        cancelled.save()
+
+        statements = []
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", count_statement)
+        try:
+            summary = Order.customer_summary(1000)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_statement)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(summary["cust_id"], 1000)
+        self.assertEqual(summary["order_count"], 3)
+        self.assertEqual(summary["orders_by_status"], {"Received": 2, "Processing": 0, "Cancelled": 1})
+        self.assertEqual(summary["total_spend"], 600)
+        self.assertEqual(summary["last_order_id"], 4)
+
+        summary = Order.customer_summary(999)
+        self.assertEqual(summary["order_count"], 0)
+        self.assertEqual(summary["orders_by_status"], {"Received": 0, "Processing": 0, "Cancelled": 0})
+        self.assertEqual(summary["total_spend"], 0)
+        self.assertIsNone(summary["last_order_id"])
+
+    def test_paginate_orders(self):
+        """Page through Orders with a keyset cursor"""
+        for cust_id in range(5):
+            Order(cust_id = cust_id, order_items = [OrderItem(item_id = 100, \
+                item_name = "ipad", item_qty = 1, item_price = 888)]).create()
+
+        first_page = Order.paginate(Order.query, limit=2)
+        self.assertEqual([order.cust_id for order in first_page], [0, 1])
+        second_page = Order.paginate(Order.query, after=first_page[-1].id, limit=2)
+        self.assertEqual([order.cust_id for order in second_page], [2, 3])
+        last_page = Order.paginate(Order.query, after=second_page[-1].id, limit=2)
+        self.assertEqual([order.cust_id for order in last_page], [4])
+
+        # filtered queries page the same way
+        item_page = Order.paginate(Order.find_by_item(100), after=first_page[0].id, limit=10)
+        self.assertEqual(len(item_page), 4)
+
+    def test_list_orders_query_count(self):
+        """ Listing Orders loads their items in a constant number of queries """
+        for cust_id in range(10):
+            Order(cust_id = cust_id, order_items = [OrderItem(item_id = 100 + i, \
+                item_name = "ipad", item_qty = 1, item_price = 888) for i in range(3)]).create()
+        db.session.expire_all()
+
+        statements = []
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", count_statement)
+        try:
+            for query in (Order.all, lambda: Order.find_by_customer(3).all(), \
+                    lambda: Order.find_by_item(101).all()):
+                del statements[:]
+                orders = query()
+                results = [order.serialize() for order in orders]
+                self.assertTrue(results)
+                # one query for the orders and one for all of their items
+                self.assertEqual(len(statements), 2)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    def test_create_many_orders(self):
+        """ Create a batch of Orders in one transaction """
+        orders = [Order(cust_id = cust_id, order_items = [OrderItem(item_id = 100, \
+            item_name = "ipad", item_qty = 2, item_price = 888)]) for cust_id in (1, 2, 3)]
+        order_ids = Order.create_many(orders)
+        self.assertEqual(len(order_ids), 3)
+        self.assertEqual([order.id for order in orders], order_ids)
+        for order_id, cust_id in zip(order_ids, (1, 2, 3)):
+            order = Order.find(order_id)
+            self.assertEqual(order.cust_id, cust_id)
+            self.assertEqual(len(order.order_items), 1)
+            self.assertEqual(order.order_items[0].item_qty, 2)
+            self.assertEqual(order.item_count, 1)
+            self.assertEqual(order.total_amount, 1776)
+        self.assertEqual(Order.create_many([]), [])
+
+    def _query_plan(self, query):
+        """ Returns the database's plan for a query as text """
+        sql = str(query.statement.compile(
+            dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+        if db.engine.dialect.name == "postgresql":
+            # tiny test tables are cheaper to scan, so make the planner show its index choice
+            db.session.execute("SET LOCAL enable_seqscan = off")
+            rows = db.session.execute("EXPLAIN " + sql)
+        else:
+            rows = db.session.execute("EXPLAIN QUERY PLAN " + sql)
+        return "\n".join(str(row) for row in rows)
+
+    def test_filter_queries_use_indexes(self):
+        """ The customer and item filters are served by indexes """
+        self.order.create()
+        self.assertIn("ix_order_cust_id", self._query_plan(Order.find_by_customer(999)))
+        self.assertIn("ix_order_item_item_id_order_id", self._query_plan(OrderItem.find_by_item(2000)))
+        self.assertIn("ix_order_item", self._query_plan(Order.find_by_item(2000)))
+
+    def test_create_missing_indexes(self):
+        """ Indexes missing from an existing table are created """
+        db.session.execute("DROP INDEX ix_order_cust_id")
+        db.session.commit()
+        create_indexes()
+        self.assertIn("ix_order_cust_id", self._query_plan(Order.find_by_customer(999)))
+
+    def test_item_writes_do_not_load_other_items(self):
+        """ Adding, changing and deleting an item keeps the totals without loading the other items """
+        order = Order(cust_id = 7, order_items = [OrderItem(item_id = 100 + i, \
+            item_name = "ipad", item_qty = 1, item_price = 2.5) for i in range(50)])
+        order.create()
+        order_id = order.id
+        db.session.expire_all()
+
+        statements = []
+        def record_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", record_statement)
+        try:
+            item = OrderItem(order_id = order_id, item_id = 999, item_name = "pen", \
+                item_qty = 4, item_price = 0.1)
+            item.create()
+            item = OrderItem.find(order_id, item.id)
+            item.item_qty = 3
+            item.save()
+            OrderItem.find(order_id, item.id).delete()
+            OrderItem.find(order_id, item.id - 1).delete()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record_statement)
+        # items are only read one at a time by primary key, never by order
+        item_selects = [sql for sql in statements if sql.startswith("SELECT order_item.id")]
+        self.assertEqual(len(item_selects), 3)
+        self.assertFalse([sql for sql in item_selects if "order_item.order_id" in sql.split("WHERE")[1]])
+        # INSERT, UPDATE or DELETE of the item and one UPDATE of the Order per write,
+        # plus the lock of the Order row on PostgreSQL
+        self.assertEqual(len(statements), 15 if db.engine.dialect.name == "postgresql" else 11)
+
+        order = Order.find(order_id)
+        self.assertEqual(order.item_count, 49)
+        self.assertEqual(order.total_amount, 49 * 2.5)
+        self.assertEqual(order.version, 5)
+
+    def test_order_version(self):
+        """ Every write to an Order or its items bumps its version """
+        self.order.create()
+        self.assertEqual(self.order.version, 1)
+        self.assertEqual(Order.find_version(self.order.id), 1)
+        self.order.cust_id = 1234
+        self.order.save()
+        self.assertEqual(Order.find_version(self.order.id), 2)
+        item = self.order.order_items[0]
+        item.item_qty = 5
+        item.save()
+        self.assertEqual(Order.find_version(self.order.id), 3)
+        item.delete()
+        self.assertEqual(Order.find_version(self.order.id), 4)
+        self.assertIsNone(Order.find_version(0))
+
+    def test_stale_writes_are_rejected(self):
+        """ Writes based on an outdated version raise StaleDataError """
+        self.order.create()
+        item = self.order.order_items[0]
+        self.assertEqual(item.version, 1)
+        item.item_qty = 2
+        item.save()
+        self.assertEqual(item.version, 2)
+
+        # another writer changes the rows after they were loaded
+        db.session.execute('UPDATE "order" SET version = version + 1 WHERE id = :id', {"id": self.order.id})
+        db.session.execute("UPDATE order_item SET version = version + 1 WHERE id = :id", {"id": item.id})
+        self.order.cust_id = 1234
+        self.assertRaises(StaleDataError, self.order.save)
+        db.session.rollback()
+
+        db.session.execute("UPDATE order_item SET version = version + 1 WHERE id = :id", {"id": item.id})
+        item.item_qty = 3
+        self.assertRaises(StaleDataError, db.session.flush)
+        db.session.rollback()
+
+    def test_stream_orders(self):
+        """ Stream every Order in batches """
+        for cust_id in range(5):
+            Order(cust_id = cust_id, order_items = [OrderItem(item_id = 100, \
+                item_name = "ipad", item_qty = 1, item_price = 888)]).create()
+        db.session.expire_all()
+        orders = [(order.cust_id, len(order.order_items)) for order in Order.stream(batch_size=2)]
+        self.assertEqual(orders, [(cust_id, 1) for cust_id in range(5)])
+
+    def test_find_order_item(self):
+        """ Find an item of an Order by its id """
+        self.order.create()
+        item = self.order.order_items[0]
+        found = OrderItem.find(self.order.id, item.id)
+        self.assertIs(found, item)
+        self.assertIsNone(OrderItem.find(self.order.id + 1, item.id))
+        self.assertIsNone(OrderItem.find(self.order.id, item.id + 1))
@@ -0,0 +1,66 @@
+"""
+Test cases for the connection pool settings and statistics
+
+"""
+import unittest
+from sqlalchemy import create_engine, exc
+from service.pool import TimedQueuePool, engine_options, pool_stats
+
+POOL_CONFIG = {
+    "DB_POOL_SIZE": 3,
+    "DB_MAX_OVERFLOW": 1,
+    "DB_POOL_TIMEOUT": 5.0,
+    "DB_POOL_RECYCLE": 600,
+    "DB_POOL_PRE_PING": True,
+}
+
+
+######################################################################
+#  C O N N E C T I O N   P O O L   T E S T   C A S E S
+######################################################################
+class TestConnectionPool(unittest.TestCase):
+    """ Test Cases for the connection pool """
+
+    def test_engine_options(self):
+        """ Build engine options from the pool config """
+        config = dict(POOL_CONFIG, SQLALCHEMY_DATABASE_URI="postgres://user:pw@db:5432/orders")
+        options = engine_options(config)
+        self.assertIs(options["poolclass"], TimedQueuePool)
+        self.assertEqual(options["pool_size"], 3)
+        self.assertEqual(options["max_overflow"], 1)
+        self.assertEqual(options["pool_timeout"], 5.0)
+        self.assertEqual(options["pool_recycle"], 600)
+        self.assertTrue(options["pool_pre_ping"])
+
+    def test_engine_options_sqlite(self):
+        """ SQLite keeps its own pool """
+        config = dict(POOL_CONFIG, SQLALCHEMY_DATABASE_URI="sqlite:///orders.db")
+        self.assertEqual(engine_options(config), {})
+
+    def test_pool_stats(self):
+        """ Count checkouts, overflow and timeouts """
+        engine = create_engine(
+            "sqlite://", poolclass=TimedQueuePool, pool_size=1, max_overflow=1, pool_timeout=0.01
+        )
+        first = engine.connect()
+        second = engine.connect()
+        stats = pool_stats(engine.pool)
+        self.assertEqual(stats["pool"], "TimedQueuePool")
+        self.assertEqual(stats["checked_out"], 2)
+        self.assertEqual(stats["overflow"], 1)
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertRaises(exc.TimeoutError, engine.connect)
+        stats = pool_stats(engine.pool)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertGreaterEqual(stats["wait_time_max"], 0.01)
+        first.close()
+        second.close()
+        self.assertEqual(pool_stats(engine.pool)["checked_out"], 0)
+        engine.dispose()
+
+    def test_other_pool_stats(self):
+        """ Report the status of pools without timing """
+        engine = create_engine("sqlite://")
+        stats = pool_stats(engine.pool)
+        self.assertEqual(stats["pool"], type(engine.pool).__name__)
+        self.assertIn("status", stats)
@@ -0,0 +1,100 @@
+"""
+Test cases for the SQL profiling hooks
+
+"""
+import logging
+import unittest
+import config
+from service import status
+from service.models import Order, db, init_db
+from service.profiling import format_parameters, MAX_LOGGED_PARAMETERS
+from service.routes import app
+from .factories import OrderFactory, OrderItemFactory
+
+DATABASE_URI = config.DATABASE_URI
+BASE_API = "/api/orders"
+
+
+######################################################################
+#  P R O F I L I N G   T E S T   C A S E S
+######################################################################
+class TestProfiling(unittest.TestCase):
+    """ Test Cases for the SQL statement profiling """
+
+    @classmethod
+    def setUpClass(cls):
+        """Run once before all tests"""
+        app.config["TESTING"] = True
+        app.config["DEBUG"] = False
+        app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
+        app.logger.setLevel(logging.CRITICAL)
+        init_db(app)
+
+    def setUp(self):
+        """Runs before each test"""
+        db.drop_all()
+        db.create_all()
+        Order.cache.clear()
+        self.app = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        app.config["SQL_PROFILING_HEADERS"] = config.SQL_PROFILING_HEADERS
+        app.config["SLOW_QUERY_THRESHOLD_MS"] = config.SLOW_QUERY_THRESHOLD_MS
+
+    def _create_order(self, items=2):
+        """Creates an order through the API and returns its id"""
+        order = OrderFactory(order_items=[OrderItemFactory() for _ in range(items)])
+        resp = self.app.post(BASE_API, json=order.serialize(), content_type="application/json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        return resp.get_json()["id"]
+
+    def test_headers_are_opt_in(self):
+        """ Leave out the profiling headers unless they are turned on """
+        app.config["SQL_PROFILING_HEADERS"] = False
+        resp = self.app.get(BASE_API)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotIn("X-DB-Query-Count", resp.headers)
+        self.assertNotIn("Server-Timing", resp.headers)
+
+    def test_query_count_header(self):
+        """ Report the statements of each request in the response headers """
+        for _ in range(3):
+            self._create_order()
+        app.config["SQL_PROFILING_HEADERS"] = True
+        resp = self.app.get(BASE_API)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        # one SELECT for the orders and one for all of their items
+        self.assertEqual(resp.headers["X-DB-Query-Count"], "2")
+        self.assertRegex(resp.headers["Server-Timing"], r'^db;dur=[0-9.]+;desc="2 queries"$')
+
+        resp = self.app.get("/")
+        self.assertEqual(resp.headers["X-DB-Query-Count"], "0")
+
+    def test_slow_query_log(self):
+        """ Log statements over the threshold with their parameters """
+        order_id = self._create_order()
+        app.config["SLOW_QUERY_THRESHOLD_MS"] = 0
+        with self.assertLogs("flask.app.slow_query", level="WARNING") as logs:
+            self.app.get("{}/{}".format(BASE_API, order_id))
+        self.assertTrue(logs.output)
+        message = logs.output[0]
+        self.assertIn("GET {}/{}".format(BASE_API, order_id), message)
+        self.assertIn("SELECT", message)
+        self.assertIn("parameters=", message)
+
+    def test_fast_queries_are_not_logged(self):
+        """ Keep statements under the threshold out of the slow query log """
+        order_id = self._create_order()
+        app.config["SLOW_QUERY_THRESHOLD_MS"] = 60000
+        with self.assertRaises(AssertionError):
+            with self.assertLogs("flask.app.slow_query", level="WARNING"):
+                self.app.get("{}/{}".format(BASE_API, order_id))
+
+    def test_format_parameters(self):
+        """ Cut long parameter lists down for the log """
+        self.assertEqual(format_parameters((1, "a")), "(1, 'a')")
+        text = format_parameters([(n, "item") for n in range(1000)])
+        self.assertEqual(len(text), MAX_LOGGED_PARAMETERS + 3)
+        self.assertTrue(text.endswith("..."))
@@ -9,12 +9,15 @@ import os
 import logging
 import config
 from unittest import TestCase
+from unittest.mock import patch
 from urllib.parse import quote_plus
 import json
 
 from service import status  # HTTP Status Codes
-from service.models import OrderStatus, db, init_db
-from service.routes import app
+from service.models import IdempotencyKey, Order, OrderStatus, db, init_db
+from flask_restx import marshal
+from sqlalchemy.orm.exc import StaleDataError
+from service.routes import app, order_model, item_model
 from .factories import OrderFactory, OrderItemFactory
 
 DATABASE_URI = config.DATABASE_URI
@@ -46,6 +49,8 @@ class TestOrderResourceServer(TestCase):
         """Runs before each test"""
         db.drop_all()  # clean up the last tests
         db.create_all()  # create new tables
+        Order.cache.clear()
+        IdempotencyKey.cache.clear()
         self.app = app.test_client()
 
     def tearDown(self):
@@ -228,6 +233,94 @@ class TestOrderResourceServer(TestCase):
         updated_order = resp.get_json()
         self.assertEqual(updated_order["cust_id"], 23)
 
+    def test_create_order_idempotency_key(self):
+        """Replay the first response for a repeated Idempotency-Key"""
+        test_order = OrderFactory()
+        headers = {"Idempotency-Key": "order-retry-1"}
+        resp = self.app.post(BASE_API, json=test_order.serialize(),
+                             content_type=CONTENT_TYPE_JSON, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", resp.headers)
+        first = resp.get_json()
+
+        IdempotencyKey.cache.clear()
+        for _ in range(2):  # from the database, then from the cache
+            resp = self.app.post(BASE_API, json=test_order.serialize(),
+                                 content_type=CONTENT_TYPE_JSON, headers=headers)
+            self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(resp.headers["Idempotent-Replayed"], "true")
+            self.assertEqual(resp.get_json(), first)
+            self.assertTrue(resp.headers["Location"].endswith("/api/orders/{}".format(first["id"])))
+        self.assertEqual(len(Order.all()), 1)
+
+        resp = self.app.post(BASE_API, json=OrderFactory(cust_id=first["cust_id"] + 1).serialize(),
+                             content_type=CONTENT_TYPE_JSON, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+
+        resp = self.app.post(BASE_API, json=test_order.serialize(), content_type=CONTENT_TYPE_JSON,
+                             headers={"Idempotency-Key": "order-retry-2"})
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(resp.get_json()["id"], first["id"])
+
+    def test_create_order_bad_idempotency_key(self):
+        """Reject an Idempotency-Key that is empty or too long"""
+        for key in ("", "k" * 256):
+            resp = self.app.post(BASE_API, json=OrderFactory().serialize(),
+                                 content_type=CONTENT_TYPE_JSON, headers={"Idempotency-Key": key})
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(Order.all()), 0)
+
+    def test_update_order_if_match(self):
+        """Only update an Order while the ETag in If-Match is current"""
+        order = self._create_orders(1)[0]
+        url = "{}/{}".format(BASE_API, order.id)
+        etag = self.app.get(url).headers["ETag"]
+        resp = self.app.put(url, json={"cust_id": 23}, content_type=CONTENT_TYPE_JSON,
+                            headers={"If-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        new_etag = resp.headers["ETag"]
+        self.assertNotEqual(new_etag, etag)
+        # the ETag read before the update is stale now
+        resp = self.app.put(url, json={"cust_id": 24}, content_type=CONTENT_TYPE_JSON,
+                            headers={"If-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(self.app.get(url).get_json()["cust_id"], 23)
+        resp = self.app.put(url, json={"cust_id": 25}, content_type=CONTENT_TYPE_JSON,
+                            headers={"If-Match": "*"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_update_item_if_match(self):
+        """Only update an item while the ETag in If-Match is current"""
+        order = self._create_orders(1)[0]
+        item = self.app.get("{}/{}/items".format(BASE_API, order.id)).get_json()[0]
+        url = "{}/{}/items/{}".format(BASE_API, order.id, item["id"])
+        resp = self.app.get(url)
+        etag = resp.headers["ETag"]
+        item["item_qty"] = 11  # the factory picks 1 to 10, so this is a change
+        resp = self.app.put(url, json=item, content_type=CONTENT_TYPE_JSON, headers={"If-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.get_json()["version"], 2)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+        item["item_qty"] = 12
+        resp = self.app.put(url, json=item, content_type=CONTENT_TYPE_JSON, headers={"If-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(self.app.get(url).get_json()["item_qty"], 11)
+
+    def test_update_order_concurrent_write(self):
+        """Answer 412 to If-Match and 409 otherwise when a concurrent write wins the race"""
+        order = self._create_orders(1)[0]
+        url = "{}/{}".format(BASE_API, order.id)
+        etag = self.app.get(url).headers["ETag"]
+        with patch.object(Order, "save", side_effect=StaleDataError("0 rows matched")):
+            resp = self.app.put(url, json={"cust_id": 23}, content_type=CONTENT_TYPE_JSON,
+                                headers={"If-Match": etag})
+            self.assertEqual(resp.status_code, status.HTTP_412_PRECONDITION_FAILED)
+            self.assertEqual(resp.get_json()["error"], "Precondition Failed")
+            # no precondition was sent, so the lost race is a conflict
+            resp = self.app.put(url, json={"cust_id": 23}, content_type=CONTENT_TYPE_JSON)
+            self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+            self.assertEqual(resp.get_json()["error"], "Conflict")
+
     def test_update_order_not_found(self):
         """Try to Update an non-existing Order"""
         test_order = OrderFactory()
@@ -394,6 +487,37 @@ class TestOrderResourceServer(TestCase):
         print(updated_order_item)
         self.assertEqual(updated_order_item["item_qty"], 23)
 
+    def test_order_totals(self):
+        """ Keep an Order's item count and total in step with its items """
+        test_order = self._create_orders(1)[0]
+        first = test_order.order_items[0]
+        order_url = "{}/{}".format(BASE_API, test_order.id)
+        order = self.app.get(order_url).get_json()
+        self.assertEqual(order["item_count"], 1)
+        self.assertEqual(order["total_amount"], first.item_qty * first.item_price)
+
+        item = OrderItemFactory(item_qty=2, item_price=5.0).serialize()
+        resp = self.app.post(order_url + "/items", json=item, content_type=CONTENT_TYPE_JSON)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        new_item = resp.get_json()
+        order = self.app.get(order_url).get_json()
+        self.assertEqual(order["item_count"], 2)
+        self.assertEqual(order["total_amount"], first.item_qty * first.item_price + 10.0)
+
+        new_item["item_qty"] = 4
+        resp = self.app.put("{}/items/{}".format(order_url, new_item["id"]),
+                            json=new_item, content_type=CONTENT_TYPE_JSON)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        order = self.app.get(order_url).get_json()
+        self.assertEqual(order["item_count"], 2)
+        self.assertEqual(order["total_amount"], first.item_qty * first.item_price + 20.0)
+
+        resp = self.app.delete("{}/items/{}".format(order_url, new_item["id"]))
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        order = self.app.get(order_url).get_json()
+        self.assertEqual(order["item_count"], 1)
+        self.assertEqual(order["total_amount"], first.item_qty * first.item_price)
+
     def test_update_order_item_not_found(self):
         """ Update an Order's Item that order misses"""
         # create an Order to update
@@ -489,12 +613,62 @@ class TestOrderResourceServer(TestCase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         data = resp.get_json()
         self.assertEqual(data["status"], OrderStatus.Cancelled.name)
+        etag = resp.headers["ETag"]
+        self.assertEqual(etag, '"{}-{}"'.format(order.id, data["version"]))
+        # the ETag of the cancel can be sent straight back in If-Match
+        resp = self.app.put('api/orders/{}'.format(order.id), json={"cust_id": 7},
+                            content_type='application/json', headers={"If-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
 
     def test_cancel_order_not_found(self):
         """ Read an Item where order does not exist"""
         resp = self.app.put("api/orders/{}/cancel".format(0))
         self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_cancel_orders_bulk(self):
+        """ Cancel every Order matching a filter """
+        orders = self._create_orders(4)
+        cust_id = orders[0].cust_id
+        mine = [order.id for order in orders if order.cust_id == cust_id]
+        resp = self.app.post(BASE_API + ":cancel", json={"cust_id": cust_id},
+                             content_type=CONTENT_TYPE_JSON)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.get_json(), {"cancelled": len(mine)})
+        for order in orders:
+            data = self.app.get("{}/{}".format(BASE_API, order.id)).get_json()
+            expected = OrderStatus.Cancelled if order.id in mine else OrderStatus.Received
+            self.assertEqual(data["status"], expected.name)
+
+        ids = [order.id for order in orders]
+        resp = self.app.post(BASE_API + ":cancel", json={"ids": ids}, content_type=CONTENT_TYPE_JSON)
+        self.assertEqual(resp.get_json(), {"cancelled": len(ids) - len(mine)})
+
+    def test_cancel_orders_bulk_bad_filter(self):
+        """ Reject bulk cancel filters that are empty or not valid """
+        for body in ({}, [], {"cust_id": "1"}, {"ids": [1, "2"]}, {"ids": 1},
+                     {"status": "Received"}, {"item_id": True}):
+            resp = self.app.post(BASE_API + ":cancel", json=body, content_type=CONTENT_TYPE_JSON)
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST, body)
+        resp = self.app.post(BASE_API + ":cancel", data="cust_id=1", content_type="text/plain")
+        self.assertEqual(resp.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_customer_summary(self):
+        """ Summarize the Orders of a customer """
+        orders = self._create_orders(5)
+        cust_id = orders[0].cust_id
+        mine = [order for order in orders if order.cust_id == cust_id]
+        resp = self.app.get("/api/customers/{}/summary".format(cust_id))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.get_json()
+        self.assertEqual(data["cust_id"], cust_id)
+        self.assertEqual(data["order_count"], len(mine))
+        self.assertEqual(sum(data["orders_by_status"].values()), len(mine))
+        # new Orders are always Received
+        self.assertEqual(data["orders_by_status"][OrderStatus.Received.name], len(mine))
+        self.assertEqual(data["last_order_id"], max(order.id for order in mine))
+        self.assertAlmostEqual(data["total_spend"], sum(
+            item.item_qty * item.item_price for order in mine for item in order.order_items))
+
     def test_query_by_customer_id(self):
         """Query by customer ID"""
         orders = self._create_orders(5)
@@ -530,3 +704,270 @@ class TestOrderResourceServer(TestCase):
 
         # assert equal length of orders
         self.assertEqual(len(data), len(item_id_orders))
+
+    def test_query_by_combined_filters(self):
+        """Query by customer, item, status and id range together"""
+        orders = self._create_orders(6)
+        cust_id, item_id = orders[0].cust_id, orders[0].order_items[0].item_id
+        resp = self.app.put("{}/{}/cancel".format(BASE_API, orders[0].id))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        expected = [order.id for order in orders if order.cust_id == cust_id and
+                    any(item.item_id == item_id for item in order.order_items)]
+        query_string = {"cust_id": cust_id, "item_id": item_id}
+        resp = self.app.get(BASE_API, query_string=query_string)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([order["id"] for order in resp.get_json()], expected)
+
+        query_string["status"] = "Cancelled"
+        resp = self.app.get(BASE_API, query_string=query_string)
+        self.assertEqual([order["id"] for order in resp.get_json()], [orders[0].id])
+
+        resp = self.app.get(BASE_API, query_string={"min_id": orders[1].id, "max_id": orders[3].id,
+                                                    "status": "Received"})
+        self.assertEqual([order["id"] for order in resp.get_json()], [order.id for order in orders[1:4]])
+
+    def test_query_by_bad_filters(self):
+        """Query with an unknown status or a negative id"""
+        for query_string in ("status=Lost", "min_id=-1", "max_id=x"):
+            resp = self.app.get(BASE_API, query_string=query_string)
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST, query_string)
+
+    def test_get_order_list_paginated_by_filters(self):
+        """Keep every filter in the link to the next page"""
+        orders = self._create_orders(5)
+        resp = self.app.get(BASE_API, query_string={
+            "status": "Received", "min_id": orders[1].id, "max_id": orders[4].id, "limit": 2})
+        self.assertEqual([order["id"] for order in resp.get_json()], [orders[1].id, orders[2].id])
+        link = resp.headers["Link"]
+        for arg in ("status=Received", "min_id={}".format(orders[1].id), "max_id={}".format(orders[4].id),
+                    "after={}".format(orders[2].id)):
+            self.assertIn(arg, link)
+        resp = self.app.get(link[link.index("/api"):link.index(">")])
+        self.assertEqual([order["id"] for order in resp.get_json()], [orders[3].id, orders[4].id])
+        self.assertNotIn("Link", resp.headers)
+
+    def test_get_order_list_paginated(self):
+        """List Orders one page at a time"""
+        orders = self._create_orders(5)
+        resp = self.app.get(BASE_API, query_string="limit=2")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.get_json()
+        self.assertEqual([order["id"] for order in data], [order.id for order in orders[:2]])
+        self.assertIn('rel="next"', resp.headers["Link"])
+        self.assertIn("after={}".format(orders[1].id), resp.headers["Link"])
+
+        resp = self.app.get(BASE_API, query_string="limit=2&after={}".format(orders[3].id))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.get_json()
+        self.assertEqual([order["id"] for order in data], [orders[4].id])
+        self.assertNotIn("Link", resp.headers)
+
+    def test_get_order_list_paginated_by_customer(self):
+        """List Orders for a customer one page at a time"""
+        orders = self._create_orders(6)
+        cust_id = orders[0].cust_id
+        expected = [order.id for order in orders if order.cust_id == cust_id]
+        received = []
+        query_string = "cust_id={}&limit=1".format(cust_id)
+        while query_string is not None:
+            resp = self.app.get(BASE_API, query_string=query_string)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            received.extend(order["id"] for order in resp.get_json())
+            link = resp.headers.get("Link")
+            query_string = link[link.index("?") + 1:link.index(">")] if link else None
+        self.assertEqual(received, expected)
+
+    def test_get_order_list_bad_limit(self):
+        """List Orders with an invalid page size"""
+        resp = self.app.get(BASE_API, query_string="limit=0")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_orders_batch(self):
+        """Create a batch of Orders"""
+        test_orders = [OrderFactory(order_items=[OrderItemFactory(), OrderItemFactory()]) for _ in range(3)]
+        resp = self.app.post(
+            BASE_API + ":batch",
+            json=[order.serialize() for order in test_orders],
+            content_type=CONTENT_TYPE_JSON,
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        data = resp.get_json()
+        self.assertEqual(len(data), 3)
+        for test_order, result in zip(test_orders, data):
+            self.assertIsNone(result["error"])
+            resp = self.app.get(result["location"])
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            new_order = resp.get_json()
+            self.assertEqual(new_order["id"], result["id"])
+            self.assertEqual(new_order["cust_id"], test_order.cust_id)
+            self.assertEqual(len(new_order["order_items"]), 2)
+
+    def test_create_orders_batch_partial(self):
+        """Create a batch of Orders where some entries are not valid"""
+        good_order = OrderFactory().serialize()
+        bad_order = OrderFactory().serialize()
+        bad_order["cust_id"] = "CUST_ID"
+        resp = self.app.post(
+            BASE_API + ":batch", json=[bad_order, good_order], content_type=CONTENT_TYPE_JSON
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        data = resp.get_json()
+        self.assertIsNone(data[0]["id"])
+        self.assertIn("cust_id", data[0]["error"])
+        self.assertIsNotNone(data[1]["id"])
+        resp = self.app.get(BASE_API)
+        self.assertEqual(len(resp.get_json()), 1)
+
+    def test_create_orders_batch_bad_data(self):
+        """Create a batch of Orders with no valid entries"""
+        resp = self.app.post(BASE_API + ":batch", json=[{}], content_type=CONTENT_TYPE_JSON)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.app.post(
+            BASE_API + ":batch", json=OrderFactory().serialize(), content_type=CONTENT_TYPE_JSON
+        )
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.app.post(BASE_API + ":batch")
+        self.assertEqual(resp.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_get_order_cached(self):
+        """Get an Order twice and read it from the cache the second time"""
+        test_order = self._create_orders(1)[0]
+        url = "{0}/{1}".format(BASE_API, test_order.id)
+        hits = Order.cache.stats()["hits"]
+        first = self.app.get(url)
+        second = self.app.get(url)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.get_json(), second.get_json())
+        self.assertEqual(Order.cache.stats()["hits"], hits + 1)
+
+        resp = self.app.get("/stats/cache")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.get_json()["hits"], hits + 1)
+
+    def test_get_order_cache_invalidated(self):
+        """Writes to an Order or its items are visible on the next get"""
+        test_order = self._create_orders(1)[0]
+        url = "{0}/{1}".format(BASE_API, test_order.id)
+        order = self.app.get(url).get_json()
+
+        order["cust_id"] = 4242
+        self.app.put(url, json=order, content_type=CONTENT_TYPE_JSON)
+        self.assertEqual(self.app.get(url).get_json()["cust_id"], 4242)
+
+        self.app.put(url + "/cancel")
+        self.assertEqual(self.app.get(url).get_json()["status"], OrderStatus.Cancelled.name)
+
+        resp = self.app.post(
+            url + "/items", json=OrderItemFactory().serialize(), content_type=CONTENT_TYPE_JSON
+        )
+        item = resp.get_json()
+        self.assertEqual(len(self.app.get(url).get_json()["order_items"]), 2)
+
+        item["item_qty"] = 99
+        self.app.put(
+            "{0}/items/{1}".format(url, item["id"]), json=item, content_type=CONTENT_TYPE_JSON
+        )
+        items = self.app.get(url).get_json()["order_items"]
+        self.assertIn(99, [order_item["item_qty"] for order_item in items])
+
+        self.app.delete("{0}/items/{1}".format(url, item["id"]))
+        self.assertEqual(len(self.app.get(url).get_json()["order_items"]), 1)
+
+        self.app.delete(url)
+        self.assertEqual(self.app.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_order_not_modified(self):
+        """Get an Order conditionally with its ETag"""
+        test_order = self._create_orders(1)[0]
+        url = "{0}/{1}".format(BASE_API, test_order.id)
+        resp = self.app.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        etag = resp.headers["ETag"]
+        self.assertTrue(etag.startswith('"'))
+
+        resp = self.app.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(resp.headers["ETag"], etag)
+        self.assertEqual(len(resp.data), 0)
+
+        resp = self.app.get(url + "/items", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # a change to an item makes the old ETag stale
+        self.app.post(
+            url + "/items", json=OrderItemFactory().serialize(), content_type=CONTENT_TYPE_JSON
+        )
+        resp = self.app.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+        self.assertEqual(len(resp.get_json()["order_items"]), 2)
+
+        resp = self.app.get(url + "/items", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.get_json()), 2)
+
+    def test_get_order_changed_by_other_worker(self):
+        """Get an Order that another worker changed behind this worker's cache"""
+        test_order = self._create_orders(1)[0]
+        url = "{0}/{1}".format(BASE_API, test_order.id)
+        etag = self.app.get(url).headers["ETag"]
+        # what another process would do: its write never reaches this cache
+        db.session.execute(
+            Order.__table__.update()
+            .where(Order.__table__.c.id == test_order.id)
+            .values(status=OrderStatus.Cancelled, version=Order.__table__.c.version + 1)
+        )
+        db.session.commit()
+        resp = self.app.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+        self.assertEqual(resp.get_json()["status"], OrderStatus.Cancelled.name)
+
+    def test_get_order_not_modified_not_found(self):
+        """Get a missing Order conditionally"""
+        resp = self.app.get("{0}/{1}".format(BASE_API, 0), headers={"If-None-Match": "*"})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_orders(self):
+        """Export all Orders as newline delimited JSON"""
+        orders = self._create_orders(3)
+        resp = self.app.get(BASE_API + "/export")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.mimetype, "application/x-ndjson")
+        lines = resp.get_data(as_text=True).splitlines()
+        exported = [json.loads(line) for line in lines]
+        self.assertEqual([order["id"] for order in exported], [order.id for order in orders])
+        for order in exported:
+            self.assertEqual(len(order["order_items"]), 1)
+
+    def test_export_no_orders(self):
+        """Export an empty table"""
+        resp = self.app.get(BASE_API + "/export")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, b"")
+
+    def test_item_in_other_order(self):
+        """ Items can only be reached through their own Order """
+        first, second = self._create_orders(2)
+        item_id = self.app.get("{0}/{1}/items".format(BASE_API, first.id)).get_json()[0]["id"]
+        url = "{0}/{1}/items/{2}".format(BASE_API, second.id, item_id)
+        self.assertEqual(self.app.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.app.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        resp = self.app.get("{0}/{1}/items/{2}".format(BASE_API, first.id, item_id))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_responses_match_models(self):
+        """ Serialized Orders have exactly the documented fields """
+        order = self._create_orders(1)[0]
+        data = self.app.get("{0}/{1}".format(BASE_API, order.id)).get_json()
+        self.assertEqual(marshal(data, order_model), data)
+        self.assertEqual(marshal(data["order_items"], item_model), data["order_items"])
+        resp = self.app.get("/api/swagger.json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIn("OrderModel", resp.get_json()["definitions"])
+
+    def test_connection_pool_stats(self):
+        """ Get the connection pool statistics """
+        resp = self.app.get("/stats/pool")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIn("pool", resp.get_json())
@@ -0,0 +1,112 @@
+"""
+Test cases for the compiled payload validators
+
+"""
+import unittest
+from types import SimpleNamespace
+from flask_restx import Model, fields
+from service.models import DataValidationError, Order, OrderItem
+from service.validation import compile_model
+
+PART = Model("Part", {
+    "sku": fields.String(required=True, enum=["a", "b"]),
+    "qty": fields.Integer(required=True),
+    "weight": fields.Float(required=False),
+})
+
+BOX = Model("Box", {
+    "id": fields.Integer(readonly=True),
+    "label": fields.String(required=True),
+    "parts": fields.List(fields.Nested(PART), required=True),
+    "tags": fields.List(fields.Integer),
+})
+
+
+######################################################################
+#  V A L I D A T O R   T E S T   C A S E S
+######################################################################
+class TestValidation(unittest.TestCase):
+    """ Test Cases for compile_model """
+
+    def setUp(self):
+        self.validate = compile_model(BOX)
+
+    def test_valid_payload(self):
+        """ Convert a valid payload and drop unknown and readOnly fields """
+        data = self.validate({
+            "id": 9, "label": "box", "extra": True, "tags": [1, "2"],
+            "parts": [{"sku": "a", "qty": "3", "weight": 2}, {"sku": "b", "qty": 1}],
+        })
+        self.assertEqual(data, {
+            "label": "box", "tags": [1, 2],
+            "parts": [{"sku": "a", "qty": 3, "weight": 2.0}, {"sku": "b", "qty": 1}],
+        })
+        self.assertIsInstance(data["parts"][0]["weight"], float)
+
+    def test_all_errors_reported(self):
+        """ Report every field error of a payload together """
+        with self.assertRaises(DataValidationError) as context:
+            self.validate({
+                "label": "", "tags": [1, True],
+                "parts": [{"sku": "c", "qty": 1.5, "weight": "heavy"}, "part", {"qty": 1}],
+            })
+        self.assertEqual(str(context.exception), "Invalid Box: "
+                         "label must not be empty; "
+                         "parts[0].sku must be one of a, b; "
+                         "parts[0].qty must be int; "
+                         "parts[0].weight must be float; "
+                         "parts[1] must be an object; "
+                         "parts[2].sku is required; "
+                         "tags[1] must be int")
+
+    def test_bad_containers(self):
+        """ Reject bodies and lists of the wrong type """
+        self.assertRaisesRegex(DataValidationError, "^Invalid Box: must be an object$",
+                               self.validate, "box")
+        self.assertRaisesRegex(DataValidationError, "parts is required", self.validate, {"label": "x"})
+        self.assertRaisesRegex(DataValidationError, "parts must be a list",
+                               self.validate, {"label": "x", "parts": {}})
+
+    def test_numbers(self):
+        """ Reject booleans, fractions and non finite numbers """
+        validate = compile_model(PART)
+        for qty in (True, 1.0, "1.5", None):
+            self.assertRaises(DataValidationError, validate, {"sku": "a", "qty": qty})
+        for weight in (False, "nan", float("inf"), [1]):
+            self.assertRaises(DataValidationError, validate, {"sku": "a", "qty": 1, "weight": weight})
+
+    def test_build_types(self):
+        """ Build the objects of a model as instances of a class in the same pass """
+        validate = compile_model(BOX, {"Part": SimpleNamespace})
+        data = validate({"label": "box", "parts": [{"sku": "a", "qty": "3", "weight": None}]})
+        self.assertIsInstance(data, dict)
+        self.assertIsInstance(data["parts"][0], SimpleNamespace)
+        self.assertEqual(vars(data["parts"][0]), {"sku": "a", "qty": 3})
+        self.assertRaisesRegex(DataValidationError, r"parts\[0\]\.qty must be int",
+                               validate, {"label": "box", "parts": [{"sku": "a", "qty": "x"}]})
+
+    def test_optional_fields(self):
+        """ Let payloads leave out fields the model requires when told so """
+        validate = compile_model(PART, optional=("sku",))
+        self.assertEqual(validate({"qty": 1}), {"qty": 1})
+        self.assertRaisesRegex(DataValidationError, "sku must be one of", validate, {"sku": "c", "qty": 1})
+        self.assertRaisesRegex(DataValidationError, "qty is required", validate, {"sku": "a"})
+
+    def test_model_validators(self):
+        """ Validate Orders and items with the validators compiled by the models """
+        order = Order().deserialize({"cust_id": "7", "order_items": [
+            {"item_id": 1, "item_name": "ipad", "item_qty": "2", "item_price": 5}]})
+        self.assertEqual(order.cust_id, 7)
+        self.assertIsInstance(order.order_items[0], OrderItem)
+        self.assertIs(order.order_items[0].order, order)
+        self.assertEqual(order.order_items[0].item_qty, 2)
+        item = OrderItem().deserialize({"item_id": 1, "item_name": "ipad", "item_qty": 2, "item_price": 5})
+        self.assertEqual(item.item_price, 5.0)
+        # a wrong type used to raise a TypeError while building the message
+        self.assertRaisesRegex(DataValidationError, "item_name must be string", OrderItem().deserialize,
+                               {"item_id": 1, "item_name": 0, "item_qty": 2, "item_price": 5.0})
+        with self.assertRaises(DataValidationError) as context:
+            Order().deserialize({"cust_id": "x", "order_items": [{"item_id": 1}]})
+        message = str(context.exception)
+        self.assertTrue(message.startswith("Invalid Order: cust_id must be int"))
+        self.assertIn("order_items[0].item_price is required", message)